@@ -0,0 +1,171 @@
+"""
+Synthetic snapshot generator.
+
+Writes two HAR files of the same fictional application, together with their ``.domain.txt`` files, in the layout
+of ``har_exports``. The second version differs from the first by a configurable share of changed pages, changed
+async responses and removed or added pages, so the comparators have something to find.
+
+Usage:
+    python -m benchmarks.har_generator [--pages 100] [--async-endpoints 3] [--dom-depth 6] [--body-kb 16]
+                                       [--mutation-rate 0.1] [--seed 0] [--directory ./tmp/benchmark]
+                                       [--name synthetic]
+"""
+import argparse
+import json
+import os
+import random
+
+BASE_URL = 'http://bench.local'
+
+
+def generate_page(page: int, dom_depth: int, body_kb: int, rng: random.Random) -> str:
+    """
+    Returns an HTML page with nested sections ``dom_depth`` levels deep, whose leaves are padded with text until the
+    page has about ``body_kb`` kilobytes.
+    """
+    def section(depth: int, path: str) -> str:
+        if depth >= dom_depth:
+            # the text of the leaves is filled in once the size of the layout is known
+            return f'<p class="text" id="p{path}">\0</p>'
+        children = ''.join(section(depth + 1, f'{path}-{i}') for i in range(2 if depth < dom_depth - 1 else 3))
+        return f'<div class="level{depth} c{rng.randint(0, 4)}" id="d{path}">{children}</div>'
+
+    layout = section(1, str(page)).split('\0')
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit']
+    text_size = max(body_kb * 1024 - sum(map(len, layout)), 0) // len(layout)
+    body = layout[0]
+    for part in layout[1:]:
+        body += ' '.join(rng.choice(words) for _ in range(text_size // 6 + 1)) + part
+    links = ''.join(f'<a href="/page/{rng.randint(0, 10000)}">link</a>' for _ in range(5))
+    return (f'<html><head><title>Page {page}</title></head><body><nav class="nav">{links}</nav>'
+            f'<form method="get"><input name="q" type="text"/></form>{body}</body></html>')
+
+
+def mutate_page(html: str, rng: random.Random) -> str:
+    """
+    Changes the structure of a page: renames some classes and adds or drops a section.
+    """
+    html = html.replace('class="level2', 'class="level2 changed', rng.randint(1, 3))
+    if rng.random() < 0.5:
+        return html.replace('</body>', '<section class="added"><h2>New</h2><p>content</p></section></body>')
+    start = html.find('<p class="text"')
+    end = html.find('</p>', start)
+    if start == -1 or end == -1:
+        return html
+    return html[:start] + html[end + len('</p>'):]
+
+
+def generate_response(page: int, endpoint: int, rng: random.Random, mutated: bool) -> dict:
+    items = [{'id': i, 'name': f'item {i}', 'price': rng.random() * 100, 'tags': ['a', 'b']}
+             for i in range(rng.randint(1, 5))]
+    response = {'page': page, 'endpoint': endpoint, 'items': items, 'total': len(items)}
+    if mutated:
+        del response['total']
+        response['count'] = str(len(items))
+    return response
+
+
+def create_entry(method: str, url: str, content_type: str, text: str, is_xhr: bool = False,
+                 post_text: str = None) -> dict:
+    request_headers = [{'name': 'Accept', 'value': '*/*'}]
+    if is_xhr:
+        request_headers.append({'name': 'X-Requested-With', 'value': 'XMLHttpRequest'})
+    request = {'method': method, 'url': url, 'httpVersion': 'HTTP/1.1', 'headers': request_headers,
+               'queryString': [], 'cookies': []}
+    if post_text is not None:
+        request['postData'] = {'mimeType': 'application/json', 'text': post_text}
+    return {
+        'request': request,
+        'response': {
+            'status': 200, 'httpVersion': 'HTTP/1.1', 'cookies': [],
+            'headers': [{'name': 'Content-Type', 'value': content_type}],
+            'content': {'size': len(text), 'mimeType': content_type, 'text': text},
+        },
+    }
+
+
+def write_har(path: str, entries) -> int:
+    """
+    Writes the entries as HAR file one by one and returns their number.
+    """
+    count = 0
+    with open(path, 'w') as f:
+        f.write('{"log": {"version": "1.2", "creator": {"name": "scrooge-benchmark", "version": "1"}, '
+                '"pages": [], "entries": [')
+        for entry in entries:
+            f.write(('' if count == 0 else ', ') + json.dumps(entry))
+            count += 1
+        f.write(']}}')
+    return count
+
+
+def generate_entries(version: int, pages: int, async_endpoints: int, dom_depth: int, body_kb: int,
+                     mutation_rate: float, seed: int):
+    """
+    Yields the entries of one version of the application. Both versions draw the same random numbers for the same
+    page, so they only differ where a mutation was drawn.
+    """
+    for page in range(pages):
+        rng = random.Random(f'{seed}-{page}')
+        removed, page_mutated, response_mutated = (rng.random() < mutation_rate / 4, rng.random() < mutation_rate,
+                                                   rng.random() < mutation_rate)
+        url_page = page
+        if version == 2 and removed:
+            # the page is gone and another one took its place
+            url_page = pages + page
+        html = generate_page(page, dom_depth, body_kb, rng)
+        if version == 2 and page_mutated:
+            html = mutate_page(html, rng)
+        yield create_entry('GET', f'{BASE_URL}/page/{url_page}?id={page}', 'text/html; charset=utf-8', html)
+
+        for endpoint in range(async_endpoints):
+            response = generate_response(page, endpoint, rng, version == 2 and response_mutated and endpoint == 0)
+            yield create_entry('POST', f'{BASE_URL}/api/{page % 10}/{endpoint}', 'application/json',
+                               json.dumps(response), True, json.dumps({'page': page, 'filter': 'all'}))
+
+
+def generate_snapshot_pair(directory: str, name: str = 'synthetic', pages: int = 100, async_endpoints: int = 3,
+                           dom_depth: int = 6, body_kb: int = 16, mutation_rate: float = 0.1,
+                           seed: int = 0) -> (str, str):
+    """
+    Writes the HAR and domain files of two versions of a synthetic application.
+
+    Parameters:
+    - directory (str): The directory for the files, created if necessary.
+    - name (str): Prefix of the snapshot names.
+    - pages (int): Number of HTML pages per version.
+    - async_endpoints (int): Number of JSON requests each page makes.
+    - dom_depth (int): Nesting depth of the page sections.
+    - body_kb (int): Approximate size of a page in kilobytes.
+    - mutation_rate (float): Share of pages and responses that change between the versions. A quarter of it is the
+      share of pages that are replaced by a new page.
+    - seed (int): Seed of the random content.
+
+    Returns:
+    - (str, str): The names of the two snapshots.
+    """
+    os.makedirs(directory, exist_ok=True)
+    names = f'{name}_v1', f'{name}_v2'
+    for version, snapshot_name in enumerate(names, start=1):
+        write_har(os.path.join(directory, snapshot_name + '.har'),
+                  generate_entries(version, pages, async_endpoints, dom_depth, body_kb, mutation_rate, seed))
+        with open(os.path.join(directory, snapshot_name + '.domain.txt'), 'w') as f:
+            f.write(BASE_URL)
+    return names
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes two versions of a synthetic application as HAR files')
+    parser.add_argument('--pages', type=int, default=100, help='Number of HTML pages per version')
+    parser.add_argument('--async-endpoints', type=int, default=3, help='Number of JSON requests per page')
+    parser.add_argument('--dom-depth', type=int, default=6, help='Nesting depth of the page sections')
+    parser.add_argument('--body-kb', type=int, default=16, help='Approximate size of a page')
+    parser.add_argument('--mutation-rate', type=float, default=0.1, help='Share of pages that change')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random content')
+    parser.add_argument('--directory', default='./tmp/benchmark', help='Where to write the HAR files')
+    parser.add_argument('--name', default='synthetic', help='Prefix of the snapshot names')
+    args = parser.parse_args()
+
+    for snapshot_name in generate_snapshot_pair(args.directory, args.name, args.pages, args.async_endpoints,
+                                                args.dom_depth, args.body_kb, args.mutation_rate, args.seed):
+        print(os.path.join(args.directory, snapshot_name + '.har'))
@@ -0,0 +1,102 @@
+"""
+Peak memory benchmark for HAR ingestion.
+
+Writes a synthetic HAR file of the requested size and compares the peak resident memory of ``json.load`` with the
+streaming ``iter_har_entries`` reader. Each variant runs in its own subprocess so the measurements do not influence
+each other.
+
+Usage:
+    python -m benchmarks.har_memory [--size-mb 2048] [--body-kb 256] [--path ./tmp/benchmark.har] [--keep]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from src.snapshot.har_reader import iter_har_entries
+
+
+def generate_har(path: str, size_mb: int, body_kb: int):
+    """
+    Writes a HAR file of roughly ``size_mb`` megabytes whose entries alternate between HTML pages and JSON responses
+    with bodies of ``body_kb`` kilobytes.
+    """
+    body_size = body_kb * 1024
+    html_body = ('<html><body>' + '<div class="item">x</div>' * (body_size // 25) + '</body></html>')
+    json_body = json.dumps({'items': [{'id': i, 'name': 'item'} for i in range(body_size // 26)]})
+    target_size = size_mb * 1024 * 1024
+
+    with open(path, 'w') as f:
+        f.write('{"log": {"version": "1.2", "creator": {"name": "scrooge-benchmark", "version": "1"}, '
+                '"pages": [], "entries": [')
+        written = 0
+        i = 0
+        while written < target_size:
+            is_html = i % 2 == 0
+            entry = {
+                'request': {'method': 'GET', 'url': f'http://localhost/page/{i}', 'headers': []},
+                'response': {
+                    'headers': [{'name': 'Content-Type', 'value': 'text/html' if is_html else 'application/json'}],
+                    'content': {'text': html_body if is_html else json_body},
+                },
+            }
+            chunk = ('' if i == 0 else ', ') + json.dumps(entry)
+            f.write(chunk)
+            written += len(chunk)
+            i += 1
+        f.write(']}}')
+    return i
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def measure(mode: str, path: str) -> dict:
+    start = time.perf_counter()
+    with open(path, 'r') as f:
+        if mode == 'load':
+            count = len(json.load(f)['log']['entries'])
+        else:
+            count = sum(1 for _ in iter_har_entries(f))
+    return {'mode': mode, 'entries': count, 'seconds': round(time.perf_counter() - start, 2),
+            'peak_rss_mb': round(peak_rss_mb(), 1)}
+
+
+def run_subprocess(mode: str, path: str) -> dict:
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.har_memory', '--measure', mode, '--path', path],
+                            capture_output=True, text=True)
+    if output.returncode != 0:
+        return {'mode': mode, 'error': output.stderr.strip().splitlines()[-1:]}
+    return json.loads(output.stdout)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Peak memory benchmark for HAR ingestion')
+    parser.add_argument('--size-mb', type=int, default=2048, help='Size of the synthetic HAR file')
+    parser.add_argument('--body-kb', type=int, default=256, help='Size of a single response body')
+    parser.add_argument('--path', default='./tmp/benchmark.har', help='Where to write the synthetic HAR file')
+    parser.add_argument('--keep', action='store_true', help='Keep the synthetic HAR file after the run')
+    parser.add_argument('--measure', choices=['load', 'stream'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.path)))
+        sys.exit()
+
+    os.makedirs(os.path.dirname(args.path) or '.', exist_ok=True)
+    entry_count = generate_har(args.path, args.size_mb, args.body_kb)
+    print(f'HAR file: {args.path} ({os.path.getsize(args.path) / (1024 * 1024):.0f} MB, {entry_count} entries)')
+    try:
+        for mode in ['stream', 'load']:
+            print(json.dumps(run_subprocess(mode, args.path)))
+    finally:
+        if not args.keep:
+            os.remove(args.path)
@@ -0,0 +1,160 @@
+"""
+Runtime benchmark of the compare pipeline.
+
+Generates synthetic snapshot pairs at several scales with ``benchmarks.har_generator`` and times HAR ingestion, each
+comparator, report generation and graph building separately. The results are written as JSON; pass the file of an
+earlier run as ``--baseline`` to print the change of every stage.
+
+The screenshot comparator needs Chrome and is left out unless ``--dhash`` is given.
+
+Usage:
+    python -m benchmarks.pipeline [--scales 10,100,1000] [--async-endpoints 3] [--dom-depth 6] [--body-kb 16]
+                                  [--mutation-rate 0.1] [--seed 0] [--parser html.parser] [--dhash]
+                                  [--directory ./tmp/benchmark] [--output ./tmp/benchmark/results.json]
+                                  [--baseline previous.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import time
+from datetime import datetime
+
+from benchmarks.har_generator import generate_snapshot_pair
+from src.entity.Comparator import DHashComparator
+from src.graph.render_snapshot import build_graph, graph_to_graphviz
+from src.render.render_pool import RenderPool
+from src.report.report import generate_report
+from src.shared.document_cache import DocumentCache, DEFAULT_PARSER
+from src.snapshot.snapshot import parse_har_to_snapshot, create_comparators, compare_identifier, \
+    fingerprint_snapshot
+
+
+class Stopwatch:
+    """
+    Sums up the wall time of named stages.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextlib.contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = self.seconds.get(stage, 0) + time.perf_counter() - start
+
+    def wrap(self, stage: str, function):
+        def timed(*args, **kwargs):
+            with self.measure(stage):
+                return function(*args, **kwargs)
+        return timed
+
+    def rounded(self) -> dict:
+        return {stage: round(seconds, 4) for stage, seconds in self.seconds.items()}
+
+
+def run_scale(directory: str, pages: int, settings: dict) -> dict:
+    """
+    Generates a snapshot pair with ``pages`` pages and times every stage of comparing it.
+    """
+    name1, name2 = generate_snapshot_pair(directory, f'pages{pages}', pages, settings['async_endpoints'],
+                                          settings['dom_depth'], settings['body_kb'], settings['mutation_rate'],
+                                          settings['seed'])
+    stages = Stopwatch()
+    comparator_times = Stopwatch()
+
+    with stages.measure('ingestion'):
+        snap1 = parse_har_to_snapshot(name1, directory)
+        snap2 = parse_har_to_snapshot(name2, directory)
+
+    with stages.measure('compare'):
+        fingerprint_snapshot(snap1)
+        fingerprint_snapshot(snap2)
+        document_cache = DocumentCache(settings['parser'])
+        with RenderPool(os.path.join(directory, 'render'), size=1) as render_pool:
+            comparators = create_comparators(snap1, snap2, os.path.join(directory, 'screenshots', ''),
+                                             document_cache, render_pool)
+            if not settings['dhash']:
+                comparators = [c for c in comparators if not isinstance(c, DHashComparator)]
+            for comparator in comparators:
+                comparator.check_similarity = comparator_times.wrap(type(comparator).__name__,
+                                                                    comparator.check_similarity)
+            for static_request in snap1.static_requests:
+                compare_identifier(comparators, document_cache, snap1, snap2, static_request.identifier)
+            for comparator in comparators:
+                with comparator_times.measure(type(comparator).__name__):
+                    comparator.check_similarity_global()
+
+    with stages.measure('report'):
+        generate_report(snap1, snap2)
+
+    with stages.measure('graph'):
+        graph_to_graphviz(build_graph(snap1, snap2, f'{name1}-{name2}')).source
+
+    har_bytes = sum(os.path.getsize(os.path.join(directory, name + '.har')) for name in (name1, name2))
+    return {
+        'pages': pages,
+        'static_requests': len(snap1.static_requests) + len(snap2.static_requests),
+        'async_requests': sum(len(r.async_requests) for r in snap1.static_requests + snap2.static_requests),
+        'har_mb': round(har_bytes / (1024 * 1024), 2),
+        'changes': sum(len(request.changes) for snapshot in (snap1, snap2) for static_request in
+                       snapshot.static_requests for request in [static_request] + static_request.async_requests),
+        'seconds': stages.rounded(),
+        'comparator_seconds': comparator_times.rounded(),
+    }
+
+
+def print_comparison(results: dict, baseline: dict):
+    """
+    Prints the relative change of every stage compared to an earlier result file, for the scales both runs share.
+    """
+    baseline_runs = {run['pages']: run for run in baseline['runs']}
+    for run in results['runs']:
+        previous = baseline_runs.get(run['pages'])
+        if previous is None:
+            continue
+        for key in ['seconds', 'comparator_seconds']:
+            for stage, seconds in run[key].items():
+                before = previous[key].get(stage)
+                if before:
+                    print(f"{run['pages']:>7} pages  {stage:<40} {before:>9.3f}s -> {seconds:>9.3f}s "
+                          f"({(seconds - before) / before:+.0%})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runtime benchmark of the compare pipeline')
+    parser.add_argument('--scales', default='10,100,1000', help='Comma separated numbers of pages')
+    parser.add_argument('--async-endpoints', type=int, default=3, help='Number of JSON requests per page')
+    parser.add_argument('--dom-depth', type=int, default=6, help='Nesting depth of the page sections')
+    parser.add_argument('--body-kb', type=int, default=16, help='Approximate size of a page')
+    parser.add_argument('--mutation-rate', type=float, default=0.1, help='Share of pages that change')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random content')
+    parser.add_argument('--parser', default=DEFAULT_PARSER, help='BeautifulSoup parser backend')
+    parser.add_argument('--dhash', action='store_true', help='Include the screenshot comparator (needs Chrome)')
+    parser.add_argument('--directory', default='./tmp/benchmark', help='Where to write the HAR files')
+    parser.add_argument('--output', default='./tmp/benchmark/results.json', help='Where to write the results')
+    parser.add_argument('--baseline', help='Result file of an earlier run to compare with')
+    args = parser.parse_args()
+
+    settings = {'async_endpoints': args.async_endpoints, 'dom_depth': args.dom_depth, 'body_kb': args.body_kb,
+                'mutation_rate': args.mutation_rate, 'seed': args.seed, 'parser': args.parser,
+                'dhash': args.dhash}
+    results = {'created': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+               'settings': settings, 'runs': []}
+    for scale in [int(scale) for scale in args.scales.split(',')]:
+        run = run_scale(args.directory, scale, settings)
+        results['runs'].append(run)
+        print(json.dumps(run))
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results: {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            print_comparison(results, json.load(f))
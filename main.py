@@ -1,13 +1,23 @@
 import subprocess
 from datetime import datetime
-from src.graph.render_snapshot import render_snapshot
+from src.graph.render_snapshot import render_snapshot, GRAPH_FORMATS
 from src.proxy.proxy import Proxy
-from src.report.report import generate_report, list_requests
+from src.report.report import generate_report, generate_timeline_report, list_requests
+from src.report.report_writer import REPORT_WRITERS
 from tabulate import tabulate
 import sys
 import os
 
-from src.snapshot.snapshot import parse_har_to_snapshot, compare_snapshots
+from src.snapshot.snapshot import load_snapshot, compare_snapshots, learn_snapshot_routes
+from src.snapshot.timeline import compare_timeline
+from src.snapshot.har_reader import CAPTURE_EXTENSIONS
+from src.snapshot.live_compare import LiveComparison
+from src.proxy.sharded_crawl import run_sharded_crawl
+from src.snapshot.compiled_snapshot import save_compiled_snapshot, pack_snapshot
+from src.shared.document_cache import DEFAULT_PARSER
+from src.entity.TreeComparator import DEFAULT_NODE_BUDGET
+from src.shared.metrics import metrics, set_verbose, write_metrics
+from src.shared.route_templates import route_normalizer, SEGMENT_PATTERNS
 
 
 def print_help():
@@ -18,15 +28,130 @@ def print_help():
     Usage: command [parameters]
     
     Available commands:
-      crawl <crawler> <name> <url> <proxy_port> : Start CrawlJax or BlackWidow for the given url and save the result as <name>.har
+      crawl <crawler> <name> <url> <proxy_port> : Start CrawlJax or BlackWidow for the given url and save the result as <name>.jsonl
+        --baseline <snap> : Compare every captured page with the snapshot <snap> while crawling and write the report when the crawler exits
+        --shards <k> : Run k crawlers behind k proxies on the ports <proxy_port> to <proxy_port>+k-1 and merge their captures
+        --seeds <filename> : Start URLs, one per line, distributed over the shards (default <url>)
       proxy <name> <url> : Start the proxy without a Crawler for manual crawling 
       list : List the snapshot files
+      pack <snap> : Compile the snapshot and remove its capture file, its responses stay in har_exports/blobs/
       compare <snap1> <snap2> <report_filename> : Compare two snapshots and generate a report
+        --parser <html.parser|lxml> : BeautifulSoup parser backend for the HTML comparators (default html.parser)
+        --jobs <n> : Number of worker processes for parsing the capture and for the comparators (default 1)
+        --render-workers <n> : Number of headless browsers per process for the screenshots (default 2)
+        --screenshot-cache <dir> : Directory of the persistent screenshot cache (default ./cache/screenshots/)
+        --screenshot-cache-size <mb> : Size cap of the screenshot cache, 0 disables it (default 1024)
+        --tree-budget <n> : Largest DOM tree in nodes, after folding identical subtrees, compared by tree edit distance; larger pages are compared by position (default 2000)
+        --match-pages : Match pages that moved to another URL by their structure and compare them as one page
+        --format <text|jsonl|csv|html> : Format of the report (default text)
+        --routes <filename> : Route templates, one per line, e.g. /product/{id}; matching paths become one request
+        --route-patterns <int,uuid,date,hash,slug|all> : Replace path segments that match the patterns by the pattern name, e.g. /product/{int}
+        --graph <graphviz|json|none> : Render the graph with graphviz, write its nodes and edges to reports/graphs/<name>.json or skip it (default graphviz)
+        --graph-collapse : Fold unchanged pages that are not next to a changed page into one node per cluster
+        --graph-cluster <depth> : Group the pages of the graph by the first <depth> segments of their URL path
+        --graph-max-nodes <n> : Show at most n pages in the graph, changed pages first
+        --graph-stagger <n> : Stagger wide graphs over n ranks with unflatten before the layout, 0 skips it; skipped with --graph-collapse and --graph-max-nodes (default 3)
+        --no-view : Do not open the rendered graph in the viewer
+        --profile : Record wall and CPU time per stage, comparator and page and print the slowest pages
+        --metrics <filename> : File for the recorded metrics, implies --profile (default reports/metrics_<snap1>-<snap2>.json)
+        --top <n> : Number of slowest pages in the profile summary (default 10)
+        --verbose : Print the progress and debug output of every request
+      timeline <snap1> <snap2> ... <snapN> : Compare every snapshot with the first one and with its predecessor and report when each change appeared
+        --report <filename> : File for the timeline report (default reports/timeline_<snap1>-<snapN>.txt)
+        Accepts the same options as compare
       show <snap> <report_filename> : Lists the requests in a snapshot to terminal or to filename if provided
+      routes <snap> <filename> : Learn route templates from the capture of a snapshot and print them or write them to filename for --routes
+        --min-values <n> : Number of different segments at one path position from which on it is a parameter (default 20)
       help : Show this help
     """)
 
 
+def create_crawl_command(crawler: str, url: str, proxy_port) -> str | None:
+    """
+    Returns the shell command that runs the given crawler for url through the proxy on proxy_port, or None for an
+    unknown crawler.
+    """
+    if "CrawlJax" == crawler:
+        return f"java -jar crawler/CrawlJax/target/CrawlJax-1.0-SNAPSHOT-jar-with-dependencies.jar {url} {proxy_port}"
+    elif "BlackWidow" == crawler:
+        return f"cd crawler/BlackWidow && python3 crawl.py --url {url} --proxy 127.0.0.1:{proxy_port}"
+    return None
+
+
+def pop_option(name: str, default: str = None) -> str:
+    """
+    Removes the option ``name`` and its value from the command line arguments and returns the value.
+
+    Parameters:
+    - name (str): The option name including the leading dashes, e.g. '--parser'.
+    - default (str): The value returned if the option is not given.
+
+    Returns:
+    - str: The option value or the default.
+    """
+    if name not in sys.argv:
+        return default
+    index = sys.argv.index(name)
+    value = sys.argv[index + 1]
+    del sys.argv[index:index + 2]
+    return value
+
+
+def pop_flag(name: str) -> bool:
+    """
+    Removes the flag ``name`` from the command line arguments and returns whether it was given.
+    """
+    if name not in sys.argv:
+        return False
+    sys.argv.remove(name)
+    return True
+
+
+html_parser = pop_option('--parser', DEFAULT_PARSER)
+jobs = int(pop_option('--jobs', '1'))
+render_workers = int(pop_option('--render-workers', '2'))
+screenshot_cache_dir = pop_option('--screenshot-cache', './cache/screenshots/')
+screenshot_cache_size = int(pop_option('--screenshot-cache-size', '1024'))
+tree_node_budget = int(pop_option('--tree-budget', str(DEFAULT_NODE_BUDGET)))
+match_pages = pop_flag('--match-pages')
+timeline_report_filename = pop_option('--report')
+report_format = pop_option('--format', 'text')
+if report_format not in REPORT_WRITERS:
+    print(f"Invalid report format {report_format}. Use one of {', '.join(REPORT_WRITERS)}")
+    sys.exit()
+report_extension = REPORT_WRITERS[report_format].extension
+graph_options = {
+    'graph_format': pop_option('--graph', 'graphviz'),
+    'collapse_unchanged': pop_flag('--graph-collapse'),
+    'cluster_depth': int(pop_option('--graph-cluster', '0')),
+    'max_nodes': int(pop_option('--graph-max-nodes', '0')),
+    'stagger': int(pop_option('--graph-stagger', '3')),
+    'view': not pop_flag('--no-view'),
+}
+if graph_options['graph_format'] not in GRAPH_FORMATS:
+    print(f"Invalid graph format {graph_options['graph_format']}. Use one of {', '.join(GRAPH_FORMATS)}")
+    sys.exit()
+baseline_name = pop_option('--baseline')
+shards = int(pop_option('--shards', '1'))
+seeds_filename = pop_option('--seeds')
+metrics_filename = pop_option('--metrics')
+metrics_top = int(pop_option('--top', '10'))
+metrics.enabled = pop_flag('--profile') or metrics_filename is not None
+set_verbose(pop_flag('--verbose'))
+routes_filename = pop_option('--routes')
+route_patterns = pop_option('--route-patterns', '')
+route_patterns = list(SEGMENT_PATTERNS) if route_patterns == 'all' else [p for p in route_patterns.split(',') if p]
+route_templates = []
+if routes_filename:
+    with open(routes_filename, 'r') as f:
+        route_templates = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+try:
+    route_normalizer.configure(route_patterns, route_templates)
+except ValueError as error:
+    print(error)
+    sys.exit()
+min_values = int(pop_option('--min-values', '20'))
+
 if len(sys.argv) == 1:
     print_help()
     sys.exit()
@@ -44,32 +169,75 @@ if action == "crawl":
         proxy_port = sys.argv[5]
 
     print(f"proxy port: {proxy_port}")
-    if "CrawlJax" == sys.argv[2]:
-        crawl_cmd = f"java -jar crawler/CrawlJax/target/CrawlJax-1.0-SNAPSHOT-jar-with-dependencies.jar {url} {proxy_port}"
-    elif "BlackWidow" == sys.argv[2]:
-        crawl_cmd = f"cd crawler/BlackWidow && python3 crawl.py --url {url} --proxy 127.0.0.1:{proxy_port}"
-    else:
+    crawl_cmd = create_crawl_command(crawler, url, proxy_port)
+    if crawl_cmd is None:
         print("Invalid crawler specified. Use CrawlJax or BlackWidow")
         sys.exit()
-    proxy = Proxy(os.path.join(snapshot_directory, name + '.har'), proxy_port)
+    if shards > 1 or seeds_filename:
+        if baseline_name:
+            print("--baseline cannot be combined with --shards or --seeds")
+            sys.exit()
+        seeds = [url]
+        if seeds_filename:
+            with open(seeds_filename, 'r') as f:
+                seeds = [line.strip() for line in f if line.strip()]
+        count = run_sharded_crawl(lambda seed, port: create_crawl_command(crawler, seed, port), name, url, seeds,
+                                  shards, int(proxy_port), snapshot_directory)
+        print(f"captured {count} entries in {os.path.join(snapshot_directory, name + '.jsonl')}")
+        sys.exit()
+    capture_file = os.path.join(snapshot_directory, name + '.jsonl')
+    # the live comparison must not replay the capture of an earlier crawl before the proxy replaces it
+    if os.path.exists(capture_file):
+        os.remove(capture_file)
+    live_comparison = None
+    if baseline_name:
+        baseline = load_snapshot(baseline_name, snapshot_directory, jobs)
+        live_comparison = LiveComparison(baseline, capture_file, url, f'{baseline_name}-{name}', html_parser,
+                                         render_workers, screenshot_cache_dir, screenshot_cache_size, tree_node_budget)
+    proxy = Proxy(capture_file, proxy_port, url)
     domain_f = open(os.path.join(snapshot_directory, name + '.domain.txt'), 'w')
     domain_f.write(url)
+    domain_f.close()
+    if live_comparison:
+        live_comparison.start()
 
     subprocess.run(crawl_cmd, shell=True)
     proxy.stop()
+    if live_comparison:
+        compare_name = f'{baseline_name}-{name}'
+        snap2, statistics = live_comparison.stop()
+        if os.path.exists(capture_file):
+            save_compiled_snapshot(snap2, name, snapshot_directory)
+        render_snapshot(baseline, snap2, compare_name, **graph_options)
+        generate_report(baseline, snap2, f'reports/report_{compare_name}.{report_extension}', statistics,
+                        report_format)
+        print(f'Report: reports/report_{compare_name}.{report_extension}')
 elif action == "list":
     snapshot_files = [f for f in os.listdir(snapshot_directory) if os.path.isfile(os.path.join(snapshot_directory, f))]
     table_data = []
+    captured = set()
+    for snapshot_file in snapshot_files:
+        snapshot_name, extension = os.path.splitext(snapshot_file)
+        if extension in CAPTURE_EXTENSIONS:
+            captured.add(snapshot_name)
+            file_date = os.path.getmtime(os.path.join(snapshot_directory, snapshot_file))
+            table_data.append([snapshot_name, datetime.fromtimestamp(file_date).strftime("%Y-%m-%d %H:%M:%S")])
+    # packed snapshots only have their compiled snapshot left
     for snapshot_file in snapshot_files:
-        if '.har' in snapshot_file:
-            snapshot_name = snapshot_file.rstrip('.har')
+        snapshot_name, extension = os.path.splitext(snapshot_file)
+        if extension == '.snapshot' and snapshot_name not in captured:
             file_date = os.path.getmtime(os.path.join(snapshot_directory, snapshot_file))
             table_data.append([snapshot_name, datetime.fromtimestamp(file_date).strftime("%Y-%m-%d %H:%M:%S")])
     print(tabulate(table_data, headers=('Snapshot name', 'Created at')))
+elif action == "pack":
+    snap1_name = sys.argv[2]
+    load_snapshot(snap1_name, snapshot_directory, jobs)
+    freed = pack_snapshot(snap1_name, snapshot_directory)
+    print(f"packed {snap1_name}, freed {freed / (1 << 20):.1f} MB")
 elif action == "proxy":
     name = sys.argv[2]
     url = sys.argv[3]
-    proxy = Proxy(os.path.join(snapshot_directory, name + '.har'))
+    proxy = Proxy(os.path.join(snapshot_directory, name + '.jsonl'), base_url=url)
     domain_f = open(os.path.join(snapshot_directory, name + '.domain.txt'), 'w')
     domain_f.write(url)
     input("Press Enter to stop proxy after crawling...")
@@ -79,23 +247,53 @@ elif action == "compare":
     snap1_name = sys.argv[2]
     snap2_name = sys.argv[3]
     compare_name = f'{snap1_name}-{snap2_name}'
-    report_filename = f'reports/report_{compare_name}.txt'
-    if 4 in sys.argv:
+    report_filename = f'reports/report_{compare_name}.{report_extension}'
+    if len(sys.argv) > 4:
         report_filename = sys.argv[4]
-    snap1 = parse_har_to_snapshot(snap1_name, snapshot_directory)
-    snap2 = parse_har_to_snapshot(snap2_name, snapshot_directory)
-    compare_snapshots(snap1, snap2, compare_name)
-    render_snapshot(snap1, snap2, compare_name)
-    generate_report(snap1, snap2, report_filename)
+    snap1 = load_snapshot(snap1_name, snapshot_directory, jobs)
+    snap2 = load_snapshot(snap2_name, snapshot_directory, jobs)
+    with metrics.measure('stage', 'compare'):
+        statistics = compare_snapshots(snap1, snap2, compare_name, html_parser, jobs, render_workers,
+                                       screenshot_cache_dir, screenshot_cache_size, match_pages, tree_node_budget)
+    with metrics.measure('stage', 'graph'):
+        render_snapshot(snap1, snap2, compare_name, **graph_options)
+    with metrics.measure('stage', 'report'):
+        generate_report(snap1, snap2, report_filename, statistics, report_format)
+    if metrics.enabled:
+        print(write_metrics(metrics_filename or f'reports/metrics_{compare_name}.json', metrics_top))
+
+elif action == "timeline":
+    snapshot_names = sys.argv[2:]
+    if len(snapshot_names) < 2:
+        print("timeline needs at least two snapshots")
+        sys.exit()
+    report_filename = timeline_report_filename or f'reports/timeline_{snapshot_names[0]}-{snapshot_names[-1]}.txt'
+    timeline = compare_timeline(snapshot_names, snapshot_directory, html_parser=html_parser, jobs=jobs,
+                                render_workers=render_workers, screenshot_cache_dir=screenshot_cache_dir,
+                                screenshot_cache_size=screenshot_cache_size, match_pages=match_pages,
+                                tree_node_budget=tree_node_budget)
+    print(generate_timeline_report(timeline, report_filename))
+    if metrics.enabled:
+        metrics_filename = metrics_filename or f'reports/metrics_timeline_{snapshot_names[0]}-{snapshot_names[-1]}.json'
+        print(write_metrics(metrics_filename, metrics_top))
 
 elif action == "show":
     snap1_name = sys.argv[2]
     report_filename = ''
     if len(sys.argv) == 4:
         report_filename = sys.argv[3]
-    snap1 = parse_har_to_snapshot(snap1_name, snapshot_directory)
-    render_snapshot(snap1)
-    print(list_requests(snap1, report_filename))
+    snap1 = load_snapshot(snap1_name, snapshot_directory, jobs)
+    render_snapshot(snap1, **graph_options)
+    list_requests(snap1, report_filename)
+
+elif action == "routes":
+    snap1_name = sys.argv[2]
+    templates = learn_snapshot_routes(snap1_name, snapshot_directory, min_values)
+    if len(sys.argv) > 3:
+        with open(sys.argv[3], 'w') as f:
+            f.write(''.join(template + '\n' for template in templates))
+    else:
+        print('\n'.join(templates))
 
 elif action == "help":
     print_help()
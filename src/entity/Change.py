@@ -12,6 +12,7 @@ class Change:
         get_score(self): Retrieves the score of the change.
         get_notice(self): Retrieves the notice of the change.
     """
+    __slots__ = ('score', 'notice')
     show_score = False
     score: float
     notice: str
@@ -30,6 +31,7 @@ class Change:
 
 
 class MissingRequestChange(Change):
+    __slots__ = ()
 
     def __init__(self, score: float = 0,  notice: str = 'no comment'):
         self.notice = 'Request was not present in snapshot 2'
@@ -38,6 +40,7 @@ class MissingRequestChange(Change):
         return f'MissingRequestChange'
 
 class NewRequestChange(Change):
+    __slots__ = ()
 
     def __init__(self, score: float = 0, notice: str = 'no comment'):
         self.notice = 'Request was not present in snapshot 1'
@@ -45,37 +48,53 @@ class NewRequestChange(Change):
     def __str__(self):
         return f'NewRequestChange'
 
+class RenamedRequestChange(Change):
+    __slots__ = ()
+
+    def __init__(self, score: float = 0, notice: str = 'no comment'):
+        self.notice = notice
+        self.score = score
+    def __str__(self):
+        return f'RenamedRequestChange'
+
 class AsyncRequestsChange(Change):
+    __slots__ = ()
     def __str__(self):
         return f'AsyncRequestsChange'
 
 
 class JaccardStructureChange(Change):
+    __slots__ = ()
     show_score = True
     def __str__(self):
         return f'JaccardStructureChange'
 
 
 class ParamChange(Change):
+    __slots__ = ()
     def __str__(self):
         return f'ParamChange'
 
 
 class DHashStructureChange(Change):
+    __slots__ = ()
     show_score = True
     def __str__(self):
         return f'DHashStructureChange'
 
 
 class AsyncRequestParamChange(Change):
+    __slots__ = ()
     def __str__(self):
         return f'AsyncRequestParamChange'
 
 
 class AsyncResponseChange(Change):
+    __slots__ = ()
     def __str__(self):
         return f'AsyncResponseChange'
 class TreeDifferenceStructureChange(Change):
+    __slots__ = ()
     show_score = True
     def __str__(self):
         return f'TreeDifferenceStructureChange'
@@ -7,14 +7,18 @@ from src.entity.Change import  JaccardStructureChange, ParamChange, AsyncRequest
     DHashStructureChange, AsyncRequestParamChange, AsyncResponseChange,NewRequestChange, MissingRequestChange
 from src.entity.Request import StaticRequest
 from src.entity.Snapshot import Snapshot
+from src.entity.CompareStatistics import CompareStatistics
+from src.shared.document_cache import DocumentCache
+from src.render.render_pool import RenderPool
+from src.render.screenshot_cache import ScreenshotCache
 from src.schema.json_schema import create_request_json_schema
-from src.shared.helpers import find_by_identifier, parse_multipart_formdata, sequence_matcher_to_txt, \
+from src.shared.metrics import debug, metrics
+from src.shared.helpers import parse_multipart_formdata, sequence_matcher_to_txt, \
     remove_numbers_in_string
 from bs4 import BeautifulSoup
-from html2image import Html2Image
 import dhash
 from PIL import Image
-from src.schema.json_schema import json_compare
+from src.schema.json_schema import diff_json_schema
 from slugify import slugify
 import shutil
 import re
@@ -30,6 +34,10 @@ class Comparator:
     Attributes:
         snap1 (Snapshot): The first snapshot for comparison.
         snap2 (Snapshot): The second snapshot for comparison.
+        document_cache (DocumentCache): Shared cache of parsed HTML documents.
+        statistics (CompareStatistics): Counters of the comparisons run and skipped by this comparator.
+        content_comparator (bool): Flag indicating whether the comparator only looks at the response bodies, so
+            it can be skipped for identical bodies.
 
     Methods:
         check_similarity(identifier: str) -> float:
@@ -38,9 +46,13 @@ class Comparator:
         check_similarity_global():
             Calculates the global (for all requests) similarity between the two snapshots.
     """
-    def __init__(self, snap1: Snapshot, snap2: Snapshot):
+    def __init__(self, snap1: Snapshot, snap2: Snapshot, document_cache: DocumentCache = None):
         self.snap1 = snap1
         self.snap2 = snap2
+        self.document_cache = document_cache if document_cache is not None else DocumentCache()
+        self.statistics = CompareStatistics()
+
+    content_comparator = False
 
     def check_similarity(self, identifier: str) -> float:
         return 1
@@ -55,8 +67,8 @@ class SequenceComparator(Comparator):
         return 'SequenceComparator'
 
     def check_similarity(self, identifier: str) -> float:
-        r1 = find_by_identifier(self.snap1.static_requests, identifier)
-        r2 = find_by_identifier(self.snap2.static_requests, identifier)
+        r1 = self.snap1.find_static_request(identifier)
+        r2 = self.snap2.find_counterpart(r1)
         if r1 and r2 is None:
             #r1.changes.append(PageMissingChange(1))
             return
@@ -65,7 +77,7 @@ class SequenceComparator(Comparator):
                                         self.get_previous_requests_keys(r2))
         ratio = diff.ratio()
         #r1.changes.append(SequenceChange(1 - ratio))
-        print(f'ratio {ratio}')
+        debug(f'ratio {ratio}')
 
     @staticmethod
     def get_previous_requests_keys(request: StaticRequest) -> [str]:
@@ -79,22 +91,22 @@ class PagePresenceComparator(Comparator):
 
     def check_similarity_global(self):
         for static_request in self.snap1.static_requests:
-            r2: StaticRequest = find_by_identifier(self.snap2.static_requests, static_request.identifier)
+            r2: StaticRequest = self.snap2.find_counterpart(static_request)
             if r2 is None:
                 static_request.changes.append(MissingRequestChange(1))
             else:
                 for async_request in static_request.async_requests:
-                    r2_async_request = find_by_identifier(r2.async_requests, async_request.identifier)
+                    r2_async_request = r2.find_async_request(async_request.identifier)
                     if r2_async_request is None:
                         async_request.changes.append(MissingRequestChange(1))
 
         for static_request in self.snap2.static_requests:
-            r1: StaticRequest = find_by_identifier(self.snap1.static_requests, static_request.identifier)
+            r1: StaticRequest = self.snap1.find_counterpart(static_request)
             if r1 is None:
                 static_request.changes.append(NewRequestChange(1))
             else:
                 for async_request in static_request.async_requests:
-                    r1_async_request = find_by_identifier(r1.async_requests, async_request.identifier)
+                    r1_async_request = r1.find_async_request(async_request.identifier)
                     if r1_async_request is None:
                         async_request.changes.append(NewRequestChange(1))
 
@@ -106,8 +118,8 @@ class AsyncRequestsComparator(Comparator):
         return 'Async Requests Comparator'
 
     def check_similarity(self, identifier: str) -> float:
-        r1 = find_by_identifier(self.snap1.static_requests, identifier)
-        r2 = find_by_identifier(self.snap2.static_requests, identifier)
+        r1 = self.snap1.find_static_request(identifier)
+        r2 = self.snap2.find_counterpart(r1)
         if r1 and r2 is None:
             return
 
@@ -115,7 +127,7 @@ class AsyncRequestsComparator(Comparator):
         ratio = diff.ratio()
         if ratio < 1:
             r1.changes.append(AsyncRequestsChange(1 - ratio, sequence_matcher_to_txt(diff)))
-            print(f'ratio {ratio}')
+            debug(f'ratio {ratio}')
 
     @staticmethod
     def get_async_request_keys(request: StaticRequest) -> [str]:
@@ -130,22 +142,22 @@ class ParamComperator(Comparator):
         return 'ParamComperator'
 
     def check_similarity(self, identifier: str) -> float:
-        r1 = find_by_identifier(self.snap1.static_requests, identifier)
-        r2 = find_by_identifier(self.snap2.static_requests, identifier)
+        r1 = self.snap1.find_static_request(identifier)
+        r2 = self.snap2.find_counterpart(r1)
         if r1 and r2 is None:
             return
 
-        if 'postData' in r1.har['request']:
-            if 'params' in r1.har['request']['postData'] and r1.har['request']['postData']['params']:
-                r1_param_names = sorted(map(lambda e: e['name'], r1.har['request']['postData']['params']))
-                r2_param_names = sorted(map(lambda e: e['name'], r2.har['request']['postData']['params']))
-            elif 'multipart/form-data' in r1.har['request']['postData']['mimeType']:
-                r1_parsed_data = parse_multipart_formdata(r1.har['request']['postData']['text'],
-                                                          r1.har['request']['postData']['mimeType'].split('=')[1])
+        if r1.post_data is not None:
+            if 'params' in r1.post_data and r1.post_data['params']:
+                r1_param_names = sorted(map(lambda e: e['name'], r1.post_data['params']))
+                r2_param_names = sorted(map(lambda e: e['name'], r2.post_data['params']))
+            elif 'multipart/form-data' in r1.post_data['mimeType']:
+                r1_parsed_data = parse_multipart_formdata(r1.post_data['text'],
+                                                          r1.post_data['mimeType'].split('=')[1])
                 r1_param_names = sorted(list(r1_parsed_data.keys()))
 
-                r2_parsed_data = parse_multipart_formdata(r2.har['request']['postData']['text'],
-                                                          r2.har['request']['postData']['mimeType'].split('=')[1])
+                r2_parsed_data = parse_multipart_formdata(r2.post_data['text'],
+                                                          r2.post_data['mimeType'].split('=')[1])
                 r2_param_names = sorted(list(r2_parsed_data.keys()))
             else:
                 r1_param_names = []
@@ -158,26 +170,27 @@ class ParamComperator(Comparator):
 
 
 class JaccardComparator(Comparator):
+    content_comparator = True
 
     def __str__(self):
         return 'JaccardComparator'
 
     def check_similarity(self, identifier: str) -> float:
-        r1 = find_by_identifier(self.snap1.static_requests, identifier)
-        r2 = find_by_identifier(self.snap2.static_requests, identifier)
+        r1 = self.snap1.find_static_request(identifier)
+        r2 = self.snap2.find_counterpart(r1)
         if r1 and r2 is None:
             # r1.changes.append(PageMissingChange(1))
             return
 
-        (ratio, diff1, diff2) = self.compare_html_structures(html1=r1.content, html2=r2.content)
+        (ratio, diff1, diff2) = self.compare_html_structures(self.document_cache.get(r1), self.document_cache.get(r2))
         if ratio < 1:
-            r1.changes.append(JaccardStructureChange(1 - ratio, f"\nmissing: {', '.join(list(diff1))}\nnew: {', '.join(list(diff2))}"))
-            print(f'ratio {ratio}')
+            r1.changes.append(JaccardStructureChange(1 - ratio, f"\nmissing: {', '.join(sorted(diff1))}\nnew: {', '.join(sorted(diff2))}"))
+            debug(f'ratio {ratio}')
 
-    def compare_html_structures(self, html1, html2):
+    def compare_html_structures(self, document1: BeautifulSoup, document2: BeautifulSoup):
 
-        struct1 = self.html_to_set(html1)
-        struct2 = self.html_to_set(html2)
+        struct1 = self.html_to_set(document1)
+        struct2 = self.html_to_set(document2)
 
         diff1 = struct1.difference(struct2)
         diff2 = struct2.difference(struct1)
@@ -185,10 +198,10 @@ class JaccardComparator(Comparator):
         # Calculate Jaccard similarity
         return (self.jaccard_similarity(struct1, struct2), diff1, diff2)
 
-    def html_to_set(self, html):
-        soup = BeautifulSoup(html, 'html.parser')
+    @staticmethod
+    def html_to_set(document: BeautifulSoup):
         struct = []
-        for tag in soup.find_all():
+        for tag in document.find_all():
             #struct.append(tag.name)
             if tag.has_attr('class'):
                 for c in tag['class']:
@@ -206,45 +219,89 @@ class JaccardComparator(Comparator):
     def jaccard_similarity(set1, set2):
         intersection = len(set1.intersection(set2))
         union = len(set1.union(set2))
-        print(intersection, union)
+        debug(intersection, union)
         return intersection / union if union != 0 else 0
 
 
 class DHashComparator(Comparator):
-    def __init__(self, snap1, snap2, screenshot_dir):
+    content_comparator = True
+
+    def __init__(self, snap1, snap2, screenshot_dir, render_pool: RenderPool, clear_screenshot_dir: bool = True,
+                 screenshot_cache: ScreenshotCache = None):
         super().__init__(snap1, snap2)
         self.screenshot_dir = screenshot_dir
-        shutil.rmtree(self.screenshot_dir, ignore_errors=True)
-        os.mkdir(self.screenshot_dir)
+        self.render_pool = render_pool
+        self.screenshot_cache = screenshot_cache
+        if clear_screenshot_dir:
+            self.prepare_screenshot_dir(screenshot_dir)
 
     def __str__(self):
         return 'DHashComparator'
 
     def check_similarity(self, identifier: str) -> float:
-        r1 = find_by_identifier(self.snap1.static_requests, identifier)
-        r2 = find_by_identifier(self.snap2.static_requests, identifier)
+        r1 = self.snap1.find_static_request(identifier)
+        r2 = self.snap2.find_counterpart(r1)
         if r1 and r2 is None:
             return
 
-        screenshot_path = './tmp/'
-        hti = Html2Image(output_path=screenshot_path, custom_flags=['--disable-web-security --disable-xss-auditor --timeout=5 --disable-javascript'])
-        hti.screenshot(html_str=r1.content, save_as='page1.png')
-        hti.screenshot(html_str=r2.content, save_as='page2.png')
-        hash1 = self.calculate_dhash(screenshot_path + 'page1.png')
-        hash2 = self.calculate_dhash(screenshot_path + 'page2.png')
+        (hash1, page1), (hash2, page2) = self.render_and_hash([r1.content, r2.content])
 
         similarity = self.calculate_similarity(hash1, hash2)
         if similarity < 0.99:
             snap1_save_png_path = self.screenshot_dir + 'snap1_' + slugify(identifier) + '.png'
             snap2_save_png_path = self.screenshot_dir + 'snap2_' + slugify(identifier) + '.png'
-            os.rename(screenshot_path + 'page1.png', snap1_save_png_path)
-            os.rename(screenshot_path + 'page2.png', snap2_save_png_path)
+            self.save_screenshot(page1, snap1_save_png_path)
+            self.save_screenshot(page2, snap2_save_png_path)
             r1.changes.append(DHashStructureChange(1 - similarity, f'\nsnap 1 screenshot: {snap1_save_png_path}\nsnap 2 screenshot: {snap2_save_png_path}'))
+        elif not self.screenshot_cache:
+            os.remove(page1)
+            os.remove(page2)
+        if self.screenshot_cache:
+            self.screenshot_cache.release([page1, page2])
+
+    def render_and_hash(self, html_bodies: [str]) -> [(str, str)]:
+        """
+        Returns the dHash and screenshot path for each HTML body. Bodies found in the screenshot cache are not
+        rendered again, and identical bodies are rendered only once. Cached screenshots stay leased until the caller
+        releases them, see ScreenshotCache.
+        """
+        if not self.screenshot_cache:
+            metrics.count('renders', len(html_bodies))
+            image_paths = self.render_pool.render(html_bodies)
+            return [(self.calculate_dhash(image_path), image_path) for image_path in image_paths]
+
+        settings = self.render_pool.settings()
+        keys = [self.screenshot_cache.key(html, settings) for html in html_bodies]
+        results = {}
+        for key in keys:
+            if key not in results:
+                results[key] = self.screenshot_cache.get(key)
+        missing = [key for key in results if results[key] is None]
+        metrics.count('screenshot_cache_hits', len(results) - len(missing))
+        if missing:
+            metrics.count('renders', len(missing))
+            html_by_key = dict(zip(keys, html_bodies))
+            image_paths = self.render_pool.render([html_by_key[key] for key in missing])
+            for key, image_path in zip(missing, image_paths):
+                dhash_value = self.calculate_dhash(image_path)
+                results[key] = (dhash_value, self.screenshot_cache.put(key, dhash_value, image_path))
+        return [results[key] for key in keys]
+
+    def save_screenshot(self, image_path: str, save_path: str):
+        if self.screenshot_cache:
+            shutil.copyfile(image_path, save_path)
+        else:
+            shutil.move(image_path, save_path)
+
+    @staticmethod
+    def prepare_screenshot_dir(screenshot_dir):
+        shutil.rmtree(screenshot_dir, ignore_errors=True)
+        os.mkdir(screenshot_dir)
 
     @staticmethod
     def calculate_dhash(image_path):
-        image = Image.open(image_path)
-        row, col = dhash.dhash_row_col(image)
+        with Image.open(image_path) as image:
+            row, col = dhash.dhash_row_col(image)
         return dhash.format_hex(row, col)
 
     @staticmethod
@@ -259,26 +316,31 @@ class AsyncStructureComparator(Comparator):
         return 'AsyncStructureComparator'
 
     def check_similarity(self, identifier: str) -> float:
-        r1: StaticRequest = find_by_identifier(self.snap1.static_requests, identifier)
-        r2: StaticRequest = find_by_identifier(self.snap2.static_requests, identifier)
+        r1: StaticRequest = self.snap1.find_static_request(identifier)
+        r2: StaticRequest = self.snap2.find_counterpart(r1)
 
         if r2 is not None:
             for req in r1.async_requests:
-                req2 = find_by_identifier(r2.async_requests, req.identifier)
+                req2 = r2.find_async_request(req.identifier)
                 if req2 is None:
-                    print("Req not existent in second snapshot")
+                    debug("Req not existent in second snapshot")
+                elif req.schema_fingerprint and req.schema_fingerprint == req2.schema_fingerprint:
+                    self.statistics.skipped_comparisons += 1
                 else:
+                    self.statistics.comparisons += 1
 
-                    if req.paramSchema and req2.paramSchema:
-                        diff = json_compare(req.paramSchema, req2.paramSchema)
+                    if req.paramSchema and req2.paramSchema and \
+                            req.param_schema_fingerprint != req2.param_schema_fingerprint:
+                        diff = diff_json_schema(req.paramSchema, req2.paramSchema)
                         if diff:
-                            req.changes.append(AsyncRequestParamChange(1, notice=diff))
+                            req.changes.append(AsyncRequestParamChange(1, notice='\n' + '\n'.join(diff)))
                             # req2.changes.append(AsyncRequestParamChange(1, notice=diff))
 
-                    if req.responseSchema and req2.responseSchema:
-                        diff = json_compare(req.responseSchema, req2.responseSchema)
+                    if req.responseSchema and req2.responseSchema and \
+                            req.response_schema_fingerprint != req2.response_schema_fingerprint:
+                        diff = diff_json_schema(req.responseSchema, req2.responseSchema)
                         if diff:
-                            req.changes.append(AsyncResponseChange(1, notice=diff))
+                            req.changes.append(AsyncResponseChange(1, notice='\n' + '\n'.join(diff)))
                             # req2.changes.append(AsyncResponseChange(1, notice=diff))
 
         return 1
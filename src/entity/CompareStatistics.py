@@ -0,0 +1,25 @@
+class CompareStatistics:
+    """
+    Class counting the content comparisons of a compare run.
+
+    Attributes:
+        comparisons (int): Number of content comparisons that were run.
+        skipped_comparisons (int): Number of content comparisons skipped because both sides were identical.
+
+    Methods:
+        add(other): Adds the counters of another CompareStatistics object.
+        total(): Returns the number of run and skipped comparisons together.
+    """
+    comparisons: int
+    skipped_comparisons: int
+
+    def __init__(self, comparisons: int = 0, skipped_comparisons: int = 0):
+        self.comparisons = comparisons
+        self.skipped_comparisons = skipped_comparisons
+
+    def add(self, other: 'CompareStatistics'):
+        self.comparisons += other.comparisons
+        self.skipped_comparisons += other.skipped_comparisons
+
+    def total(self) -> int:
+        return self.comparisons + self.skipped_comparisons
@@ -1,8 +1,19 @@
-from typing import List, Any, Self
+from typing import List, Any, Self, Dict
+
+from src.shared.blob_store import blob_store
 
 
 class Request:
-    url: str
+    """
+    A request of a snapshot, merged over all its samples in the capture.
+
+    Requests use slots and keep only what the comparators read, the response body is a key into the blob store, so
+    that snapshots with tens of thousands of requests stay small in memory. Every attribute has to be declared in
+    __slots__.
+    """
+    __slots__ = ('id', 'identifier', 'method', 'paramSchema', 'responseSchema', 'post_data', 'merge_counter',
+                 'changes', 'content_key', 'content_fingerprint', 'schema_fingerprint', 'param_schema_fingerprint',
+                 'response_schema_fingerprint')
     identifier: str
     id: int
     changes: [Any]
@@ -13,32 +24,66 @@ class Request:
         Request.id_count += 1
 
         self.identifier = ''
-        self.url = ''
         self.paramSchema = ''
         self.responseSchema = ''
         self.method = ''
-        self.requestHeaders = ''
-        self.response = ''
-        self.responseHeaders = ''
-        self.har = None
+        # postData of the HAR request entry, None for requests without body
+        self.post_data = None
         self.merge_counter = 0
         self.changes = []
-        self.content = ''
+        # key of the response body in the blob store, '' for requests without body
+        self.content_key = ''
+        self.content_fingerprint = ''
+        self.schema_fingerprint = ''
+        self.param_schema_fingerprint = ''
+        self.response_schema_fingerprint = ''
+
+    @property
+    def content(self) -> str:
+        return blob_store.get(self.content_key) if self.content_key else ''
+
+    @content.setter
+    def content(self, text: str):
+        self.content_key = blob_store.put(text) if text else ''
 
 
 class AsyncRequest(Request):
-    def __init__(self):
-        super().__init__()
-        self.caller = None
+    __slots__ = ()
 
 
 class StaticRequest(Request):
+    __slots__ = ('previous_requests', 'async_requests', 'previous_requests_by_identifier',
+                 'async_requests_by_identifier', 'matched_identifier')
     previous_requests: List[Self]
     async_requests: List[AsyncRequest]
+    previous_requests_by_identifier: Dict[str, Self]
+    async_requests_by_identifier: Dict[str, AsyncRequest]
 
     def __init__(self):
         super().__init__()
         self.previous_requests = []
         self.async_requests = []
+        self.previous_requests_by_identifier = {}
+        self.async_requests_by_identifier = {}
+        # identifier of the matching page in the other snapshot if the page moved to another URL
+        self.matched_identifier = ''
+
+    def add_async_request(self, request: AsyncRequest):
+        """
+        Appends an async request and keeps the identifier index in sync.
+        """
+        self.async_requests.append(request)
+        self.async_requests_by_identifier[request.identifier] = request
+
+    def find_async_request(self, identifier: str) -> AsyncRequest | None:
+        return self.async_requests_by_identifier.get(identifier)
 
+    def add_previous_request(self, request: Self):
+        """
+        Appends a previous request and keeps the identifier index in sync.
+        """
+        self.previous_requests.append(request)
+        self.previous_requests_by_identifier[request.identifier] = request
 
+    def find_previous_request(self, identifier: str) -> Self | None:
+        return self.previous_requests_by_identifier.get(identifier)
@@ -1,13 +1,33 @@
-from typing import List, Any
+from typing import List, Any, Dict
 
 from src.entity.Request import StaticRequest
 
 
 class Snapshot:
     static_requests: list[StaticRequest]
+    static_requests_by_identifier: Dict[str, StaticRequest]
     base_url: str
 
     def __init__(self, base_url: str):
         self.static_requests = []
+        self.static_requests_by_identifier = {}
         self.base_url = base_url
 
+    def add_static_request(self, request: StaticRequest):
+        """
+        Appends a static request and keeps the identifier index in sync.
+        """
+        self.static_requests.append(request)
+        self.static_requests_by_identifier[request.identifier] = request
+
+    def find_static_request(self, identifier: str) -> StaticRequest | None:
+        return self.static_requests_by_identifier.get(identifier)
+
+    def find_counterpart(self, request: StaticRequest | None) -> StaticRequest | None:
+        """
+        Returns the request of this snapshot that corresponds to a request of another snapshot, i.e. the one with the
+        same identifier, or the one it was matched to if the page moved to another URL.
+        """
+        if request is None:
+            return None
+        return self.find_static_request(request.matched_identifier or request.identifier)
@@ -1,28 +1,49 @@
 from src.entity.Change import TreeDifferenceStructureChange
 from src.entity.Comparator import Comparator
-from src.shared.helpers import find_by_identifier
+from src.entity.Snapshot import Snapshot
+from src.shared.document_cache import DocumentCache
+from src.shared.metrics import debug, metrics
+from src.shared.tree_edit_distance import tree_edit_distance, DELETE, INSERT, RENAME
 from bs4 import BeautifulSoup
 
+# nodes per tree after collapsing identical subtrees; pages with few changes stay far below it, pages that changed
+# throughout take tens of seconds at this size
+DEFAULT_NODE_BUDGET = 2000
+
 
 class TreeComparator(Comparator):
+    """
+    Compares the DOM trees of the body of two pages by their ordered tree edit distance.
+
+    Attributes:
+        node_budget (int): Maximum number of nodes per tree, after collapsing identical subtrees, for the tree edit
+            distance. Larger trees are compared by position.
+    """
+    content_comparator = True
+
+    def __init__(self, snap1: Snapshot, snap2: Snapshot, document_cache: DocumentCache = None,
+                 node_budget: int = DEFAULT_NODE_BUDGET):
+        super().__init__(snap1, snap2, document_cache)
+        self.node_budget = node_budget
 
     def check_similarity(self, identifier: str) -> float:
-        self.changes_css_paths = []
-        r1 = find_by_identifier(self.snap1.static_requests, identifier)
-        r2 = find_by_identifier(self.snap2.static_requests, identifier)
+        r1 = self.snap1.find_static_request(identifier)
+        r2 = self.snap2.find_counterpart(r1)
         if r1 and r2 is None:
             return
 
-        tree1 = self.parse_html_to_tree(r1.content)
-        tree2 = self.parse_html_to_tree(r2.content)
-        similarity = self.tree_difference_similarity(tree1, tree2)
+        tree1 = self.parse_html_to_tree(self.document_cache.get(r1))
+        tree2 = self.parse_html_to_tree(self.document_cache.get(r2))
+        similarity, edit_script = self.tree_difference_similarity(tree1, tree2)
         if similarity < 0.99:
-            r1.changes.append(TreeDifferenceStructureChange(1 - similarity, '\n' + '\n'.join(self.changes_css_paths)))
-        print("HTML page similarity:", similarity)
+            r1.changes.append(TreeDifferenceStructureChange(1 - similarity, '\n' + '\n'.join(self.edit_script_to_css_paths(edit_script))))
+        debug("HTML page similarity:", similarity)
         return 1
 
-    def parse_html_to_tree(self, html):
-        soup = BeautifulSoup(html, 'html.parser').find('body')
+    def parse_html_to_tree(self, document: BeautifulSoup):
+        soup = document.find('body')
+        if soup is None:
+            return None
         return self.parse_soup_to_tree(soup)
 
     def parse_soup_to_tree(self, soup):
@@ -30,51 +51,86 @@ class TreeComparator(Comparator):
             return None
 
         root = TreeNode(soup.name, soup)
-        for child in soup.contents:
-            if child.name:
-                root.children.append(self.parse_soup_to_tree(child))
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for child in node.soup_node.contents:
+                if child.name:
+                    child_node = TreeNode(child.name, child, node)
+                    node.children.append(child_node)
+                    stack.append(child_node)
         return root
 
     def tree_difference_similarity(self, root1, root2):
+        """
+        Calculates the similarity of two trees from their ordered tree edit distance. If one of the trees exceeds
+        the node budget, the children are compared by position instead. The distance is an upper bound, see
+        tree_edit_distance, so the similarity never overstates how alike the trees are.
+
+        Returns:
+            tuple: The similarity and the edit script as (operation, node of tree 1, node of tree 2) tuples.
+        """
         if not root1 and not root2:
-            return 1.0
+            return 1.0, []
         elif not root1 or not root2:
-            return 0.0
+            return 0.0, [(DELETE, root1, None)] if root1 else [(INSERT, None, root2)]
 
         max_diff = max(count_nodes(root1), count_nodes(root2))
-        diff_count = self.count_differences(root1, root2)
-        similarity = 1 - (diff_count / max_diff)
-        return similarity
-
-    def count_differences(self, node1, node2):
-        if not node1 and not node2:
-            return 0
-        elif not node1 or not node2:
-            if node1:
-                self.changes_css_paths.append('node not found in snapshot 2:' + self.get_css_path(node1.soup_node))
-            if node2:
-                self.changes_css_paths.append('node not found in snapshot 1:' + self.get_css_path(node2.soup_node))
-            return 1
-
+        result = tree_edit_distance(root1, root2, self.node_budget)
+        if result is None:
+            debug(f'Tree exceeds node budget of {self.node_budget}, comparing children by position')
+            metrics.count('tree_budget_exceeded')
+            result = self.count_differences(root1, root2)
+        diff_count, edit_script = result
+        similarity = max(0.0, 1 - (diff_count / max_diff))
+        return similarity, edit_script
+
+    def count_differences(self, root1, root2):
+        """
+        Compares the trees node by node, matching children by their position only.
+
+        Returns:
+            tuple: The number of differences and the edit script.
+        """
         diff_count = 0
-
-        if node1.tag != node2.tag:
-            diff_count += 1
-            self.changes_css_paths.append('different tag: ' + self.get_css_path(node1.soup_node))
-
-        num_children1 = len(node1.children)
-        num_children2 = len(node2.children)
-
-        min_children = min(num_children1, num_children2)
-
-        for i in range(min_children):
-            diff_count += self.count_differences(node1.children[i], node2.children[i])
-
-        diff_count += abs(num_children1 - num_children2)
-        if abs(num_children1 - num_children2) > 0:
-            self.changes_css_paths.append(f'children count diff {abs(num_children1 - num_children2)}: ' + self.get_css_path(node1.soup_node))
-
-        return diff_count
+        edit_script = []
+        stack = [(root1, root2)]
+        while stack:
+            node1, node2 = stack.pop()
+            if node1.tag != node2.tag:
+                diff_count += 1
+                edit_script.append((RENAME, node1, node2))
+
+            min_children = min(len(node1.children), len(node2.children))
+            stack.extend(zip(node1.children[:min_children], node2.children[:min_children]))
+
+            for child in node1.children[min_children:]:
+                diff_count += 1
+                edit_script.append((DELETE, child, None))
+            for child in node2.children[min_children:]:
+                diff_count += 1
+                edit_script.append((INSERT, None, child))
+        return diff_count, edit_script
+
+    def edit_script_to_css_paths(self, edit_script):
+        """
+        Describes the edit script by the CSS paths of the affected nodes. Nodes whose parent was deleted or inserted
+        as well are left out, the notice of the parent covers them. A rename of two nodes with the same tag stands for
+        a collapsed subtree that was matched against a different one, so its content differs.
+        """
+        deleted = {id(node1) for operation, node1, node2 in edit_script if operation == DELETE}
+        inserted = {id(node2) for operation, node1, node2 in edit_script if operation == INSERT}
+        css_paths = []
+        for operation, node1, node2 in reversed(edit_script):
+            if operation == DELETE and id(node1.parent) not in deleted:
+                css_paths.append('node not found in snapshot 2: ' + self.get_css_path(node1.soup_node))
+            elif operation == INSERT and id(node2.parent) not in inserted:
+                css_paths.append('node not found in snapshot 1: ' + self.get_css_path(node2.soup_node))
+            elif operation == RENAME and node1.tag != node2.tag:
+                css_paths.append(f'different tag ({node1.tag} -> {node2.tag}): ' + self.get_css_path(node1.soup_node))
+            elif operation == RENAME:
+                css_paths.append('different content: ' + self.get_css_path(node1.soup_node))
+        return css_paths
 
     def get_element(self, node):
         if 'id' in node.attrs:
@@ -85,6 +141,8 @@ class TreeComparator(Comparator):
             return node.name
 
     def get_css_path(self, node):
+        if node.name == 'body':
+            return 'body'
         path = [self.get_element(node)]
         for parent in node.parents:
             if parent.name == 'body':
@@ -94,17 +152,20 @@ class TreeComparator(Comparator):
 
 
 class TreeNode:
-    def __init__(self, tag, soup_node):
+    def __init__(self, tag, soup_node, parent=None):
         self.tag = tag
         self.soup_node = soup_node
+        self.parent = parent
         self.children = []
 
 
 def count_nodes(root):
     if not root:
         return 0
-    count = 1
-    print(root.children)
-    for child in root.children:
-        count += count_nodes(child)
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
     return count
@@ -1,13 +1,22 @@
+import json
+import os
+import re
+
 import graphviz
 
-from src.entity.Request import StaticRequest
+from src.entity.Request import Request, StaticRequest
 from src.entity.Snapshot import Snapshot
 from src.entity.Change import NewRequestChange, MissingRequestChange
-from src.shared.helpers import find_by_identifier, is_change_in_request
+from src.shared.helpers import is_change_in_request
 
 change_treshold = 0.01
 
-def render_snapshot(snapshot: Snapshot, snapshot2: Snapshot = None, name = 'compare'):
+GRAPH_FORMATS = ['graphviz', 'json', 'none']
+
+
+def render_snapshot(snapshot: Snapshot, snapshot2: Snapshot = None, name = 'compare', graph_format: str = 'graphviz',
+                    collapse_unchanged: bool = False, cluster_depth: int = 0, max_nodes: int = 0,
+                    stagger: int = 3, view: bool = True, directory: str = './reports/graphs'):
     """
     Render a snapshot graph using graphviz.
 
@@ -15,95 +24,296 @@ def render_snapshot(snapshot: Snapshot, snapshot2: Snapshot = None, name = 'comp
     - snapshot: The original snapshot object.
     - snapshot2: An optional second snapshot object for comparison (default=None).
     - name: The name of the graph (default='compare').
+    - graph_format: 'graphviz' renders the graph and opens it in the viewer, 'json' writes the nodes and edges to
+      <directory>/<name>.json without graphviz, 'none' skips the graph (default='graphviz').
+    - collapse_unchanged, cluster_depth, max_nodes: See build_graph.
+    - stagger: Stagger the leaves of wide graphs over this many ranks with graphviz' unflatten before the layout, 0
+      skips it (default=3). unflatten can keep graphviz from finishing the layout of a large graph, so it is also
+      skipped for graphs folded with collapse_unchanged or max_nodes.
+    - view: Open the rendered graph in the viewer (default=True).
+    - directory: The directory for the output files (default='./reports/graphs').
 
     Returns: None
 
     Example:
     render_snapshot(snapshot, snapshot2, name='compare')
     """
-    dot = graphviz.Digraph(name, node_attr={'shape': 'box'})
+    if graph_format == 'none':
+        return
+    graph = build_graph(snapshot, snapshot2, name, collapse_unchanged, cluster_depth, max_nodes)
+    if graph_format == 'json':
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, name + '.json'), 'w') as f:
+            json.dump(graph, f)
+        return
+    dot = graph_to_graphviz(graph)
+    if stagger and not collapse_unchanged and not max_nodes:
+        dot = dot.unflatten(stagger=stagger)
+    dot.render(directory=directory, view=view)
 
-    for static_request in snapshot.static_requests:
 
-        [node, color] = create_node(static_request)
-        dot.node(str(static_request.id), node, color=color)
+def build_graph(snapshot: Snapshot, snapshot2: Snapshot = None, name: str = 'compare',
+                collapse_unchanged: bool = False, cluster_depth: int = 0, max_nodes: int = 0) -> dict:
+    """
+    Build the graph of the pages of a snapshot, their async requests and the navigation between them.
 
-        for previous_request in static_request.previous_requests:
-            dot.edge(str(previous_request.id), str(static_request.id))
+    With a second snapshot, its new pages and async requests are added and linked to the pages of the first one.
+    The edges from a new page to the pages opened after it come from an index of all navigation edges of the
+    second snapshot, built in one pass.
+
+    Parameters:
+    - snapshot: The original snapshot object.
+    - snapshot2: An optional second snapshot object for comparison (default=None).
+    - name: The name of the graph (default='compare').
+    - collapse_unchanged: Fold pages without changes that are not next to a changed page, and async requests
+      without changes, into one summary node per cluster (default=False).
+    - cluster_depth: Group the pages by the first cluster_depth segments of their URL path, 0 disables clustering
+      (default=0).
+    - max_nodes: Keep at most this many page nodes, changed pages first, and fold the rest into one summary node per
+      cluster, 0 keeps all pages (default=0).
+
+    Returns:
+    - dict: {'name': str, 'nodes': [dict], 'edges': [dict]}. Every node has an 'id', 'identifier', 'kind' ('page',
+      'async', 'root' or 'summary'), 'snapshot', 'cluster', 'color' and its 'changes' as name and score; summary
+      nodes have a 'count' of folded pages, and pages whose unchanged async requests were collapsed have their
+      number as 'unchanged_async_requests'. Every edge has a 'source' and a 'target' node id.
+    """
+    nodes = {}
+    edges = []
+    # async request node ids of each page node
+    children = {}
 
-        for async_request in static_request.async_requests:
-            [node, color] = create_node(async_request)
+    def add_request(request: Request, node_id: str, kind: str, snapshot_number: int, cluster: str):
+        nodes[node_id] = create_graph_node(request, node_id, kind, snapshot_number, cluster)
 
-            dot.node(str(async_request.id), node, style='dashed', color=color)
-            dot.edge(str(static_request.id), str(async_request.id))
+    def add_edge(source: str, target: str):
+        edges.append({'source': source, 'target': target})
 
+    for static_request in snapshot.static_requests:
+        page_id = str(static_request.id)
+        cluster = path_prefix(static_request.identifier, cluster_depth)
+        add_request(static_request, page_id, 'page', 1, cluster)
+        children[page_id] = []
+
+        for previous_request in static_request.previous_requests:
+            add_edge(str(previous_request.id), page_id)
+
+        async_requests = [(async_request, 1) for async_request in static_request.async_requests]
         if snapshot2:
-            r2: StaticRequest = find_by_identifier(snapshot2.static_requests, static_request.identifier)
+            r2: StaticRequest = snapshot2.find_counterpart(static_request)
             if r2:
-                for async_request in r2.async_requests:
-                    if is_change_in_request(async_request, NewRequestChange):
-                        [node, color] = create_node(async_request)
-                        dot.node(str(async_request.id), node, style='dashed', color=color)
-                        dot.edge(str(static_request.id), str(async_request.id))
+                async_requests += [(async_request, 2) for async_request in r2.async_requests
+                                   if is_change_in_request(async_request, NewRequestChange)]
+        for async_request, snapshot_number in async_requests:
+            async_id = str(async_request.id)
+            add_request(async_request, async_id, 'async', snapshot_number, cluster)
+            add_edge(page_id, async_id)
+            children[page_id].append(async_id)
 
     if snapshot2:
+        next_requests = {}
+        for static_request in snapshot2.static_requests:
+            for previous_request in static_request.previous_requests:
+                next_requests.setdefault(previous_request.identifier, []).append(static_request)
+
         for static_request in snapshot2.static_requests:
 
             if not is_change_in_request(static_request, NewRequestChange):
                 continue
 
-            [node, color] = create_node(static_request)
-            dot.node(str(static_request.id) + '-snap2', node, color=color)
+            page_id = str(static_request.id) + '-snap2'
+            add_request(static_request, page_id, 'page', 2, path_prefix(static_request.identifier, cluster_depth))
+            children[page_id] = []
 
             for previous_request in static_request.previous_requests:
-                previous_request = find_by_identifier(snapshot.static_requests, previous_request.identifier)
+                previous_request = snapshot.find_counterpart(previous_request)
                 if previous_request:
-                    dot.edge(str(previous_request.id), str(static_request.id) + '-snap2')
+                    add_edge(str(previous_request.id), page_id)
 
-            for next_request in snapshot2.static_requests:
-                if static_request in next_request.previous_requests:
-                    next_request = find_by_identifier(snapshot.static_requests, next_request.identifier)
-                    if next_request:
-                        dot.edge(str(static_request.id) + '-snap2', str(next_request.id))
+            for next_request in next_requests.get(static_request.identifier, []):
+                next_request = snapshot.find_counterpart(next_request)
+                if next_request:
+                    add_edge(page_id, str(next_request.id))
 
-    # doctest_mark_exe()
-    dot = dot.unflatten(stagger=3)
-    dot.render(directory='./reports/graphs', view=True)
+    for edge in edges:
+        if edge['source'] not in nodes:
+            # the start of the navigation, which is no request of the snapshot
+            nodes[edge['source']] = {'id': edge['source'], 'identifier': 'Root', 'kind': 'root', 'snapshot': 1,
+                                     'cluster': '', 'color': 'black', 'changes': []}
 
+    if collapse_unchanged:
+        fold_pages(nodes, edges, children, select_unchanged_pages(nodes, edges, children), 'unchanged pages')
+    if max_nodes:
+        fold_pages(nodes, edges, children, select_surplus_pages(nodes, children, max_nodes), 'more pages')
+    return {'name': name, 'nodes': list(nodes.values()), 'edges': edges}
 
-def create_node(request):
+
+def create_graph_node(request: Request, node_id: str, kind: str, snapshot_number: int, cluster: str) -> dict:
+    color = 'black'
+    for change in request.changes:
+        if isinstance(change, MissingRequestChange):
+            color = 'red'
+        if isinstance(change, NewRequestChange):
+            color = 'green'
+    return {
+        'id': node_id,
+        'identifier': request.identifier,
+        'kind': kind,
+        'snapshot': snapshot_number,
+        'cluster': cluster,
+        'color': color,
+        'changes': [{'name': str(change), 'score': change.get_score() if change.__class__.show_score else None}
+                    for change in request.changes],
+    }
+
+
+def path_prefix(identifier: str, depth: int) -> str:
+    """
+    Returns the first depth segments of the URL path of an identifier such as 'GET/shop/cart?id', e.g. '/shop'.
+    """
+    if not depth:
+        return ''
+    path = re.sub(r'^[A-Z]+', '', identifier).split('?')[0]
+    segments = [segment for segment in path.split('/') if segment]
+    return '/' + '/'.join(segments[:depth])
+
+
+def select_unchanged_pages(nodes: dict, edges: list, children: dict) -> set:
+    """
+    Returns the pages that have no changes, no changed async request and no changed neighbour page.
+    """
+    def is_changed(page_id: str) -> bool:
+        return bool(nodes[page_id]['changes']) or any(nodes[child]['changes'] for child in children[page_id])
+
+    changed = {page_id for page_id in children if is_changed(page_id)}
+    context = set(changed)
+    for edge in edges:
+        if edge['source'] in changed and edge['target'] in children:
+            context.add(edge['target'])
+        if edge['target'] in changed and edge['source'] in children:
+            context.add(edge['source'])
+    removed = set()
+    for page_id in context:
+        # unchanged async requests of the pages that stay are only counted
+        unchanged = [child for child in children[page_id] if not nodes[child]['changes']]
+        for child in unchanged:
+            children[page_id].remove(child)
+            del nodes[child]
+            removed.add(child)
+        if unchanged:
+            nodes[page_id]['unchanged_async_requests'] = len(unchanged)
+    edges[:] = [edge for edge in edges if edge['target'] not in removed]
+    return {page_id for page_id in children if page_id not in context}
+
+
+def select_surplus_pages(nodes: dict, children: dict, max_nodes: int) -> set:
+    """
+    Returns the pages beyond the max_nodes pages with the most changes.
+    """
+    def change_count(page_id: str) -> int:
+        return len(nodes[page_id]['changes']) + sum(len(nodes[child]['changes']) for child in children[page_id])
+
+    pages = [page_id for page_id in children if nodes[page_id]['kind'] == 'page']
+    ranked = sorted(pages, key=change_count, reverse=True)
+    return set(ranked[max_nodes:])
+
+
+def fold_pages(nodes: dict, edges: list, children: dict, page_ids: set, label: str):
+    """
+    Replaces the given pages and their async requests by one summary node per cluster and redirects their edges to
+    it. Duplicate edges and edges within a summary node are dropped.
+    """
+    if not page_ids:
+        return
+    replacement = {}
+    for page_id in page_ids:
+        cluster = nodes[page_id]['cluster']
+        summary_id = f'summary-{label}-{cluster}'
+        summary = nodes.get(summary_id)
+        if summary is None:
+            summary = {'id': summary_id, 'identifier': f'{label} {cluster}'.strip(), 'kind': 'summary',
+                       'snapshot': 1, 'cluster': cluster, 'color': 'grey', 'changes': [], 'count': 0}
+            nodes[summary_id] = summary
+            children[summary_id] = []
+        summary['count'] += nodes[page_id].get('count', 1)
+        for node_id in [page_id] + children.pop(page_id):
+            replacement[node_id] = summary_id
+            del nodes[node_id]
+
+    seen = set()
+    folded_edges = []
+    for edge in edges:
+        source = replacement.get(edge['source'], edge['source'])
+        target = replacement.get(edge['target'], edge['target'])
+        if source == target or (source, target) in seen:
+            continue
+        seen.add((source, target))
+        folded_edges.append({'source': source, 'target': target})
+    edges[:] = folded_edges
+
+
+def graph_to_graphviz(graph: dict) -> graphviz.Digraph:
+    """
+    Converts a graph built by build_graph to graphviz, with one subgraph per cluster.
+    """
+    dot = graphviz.Digraph(graph['name'], node_attr={'shape': 'box'})
+    clusters = {}
+    for node in graph['nodes']:
+        clusters.setdefault(node['cluster'], []).append(node)
+    for index, (cluster, cluster_nodes) in enumerate(clusters.items()):
+        if cluster:
+            with dot.subgraph(name=f'cluster_{index}') as subgraph:
+                subgraph.attr(label=cluster)
+                for node in cluster_nodes:
+                    add_graphviz_node(subgraph, node)
+        else:
+            for node in cluster_nodes:
+                add_graphviz_node(dot, node)
+    for edge in graph['edges']:
+        dot.edge(edge['source'], edge['target'])
+    return dot
+
+
+def add_graphviz_node(dot: graphviz.Digraph, node: dict):
+    if node['kind'] == 'root':
+        dot.node(node['id'])
+        return
+    label = create_node(node)
+    if node['kind'] == 'async':
+        dot.node(node['id'], label, style='dashed', color=node['color'])
+    elif node['kind'] == 'summary':
+        dot.node(node['id'], label, style='dotted', color=node['color'])
+    else:
+        dot.node(node['id'], label, color=node['color'])
+
+
+def create_node(node: dict) -> str:
     """
     Create Node
 
-    This method takes a request object as input and creates a node for visual representation in a graph.
+    This method takes a graph node as input and creates its label for visual representation in a graph.
 
     Parameters:
-    - request: A request object representing the request to be visualized.
+    - node: A node of a graph built by build_graph.
 
     Returns:
-    A list containing two elements:
     - node: A string representing the HTML code for the created node.
-    - color: A string representing the color of the node.
 
     """
-    color = 'black'
-    node = '<<TABLE BORDER="0" CELLBORDER="1" CELLSPACING="0">'
-    node = node + '<TR><TD COLSPAN="2">' + request.identifier + '</TD></TR>'
-
-    if len(request.changes) > 0:
-        for change in request.changes:
-            if isinstance(change, MissingRequestChange):
-                color = 'red'
-            if isinstance(change, NewRequestChange):
-                color = 'green'
-            node = node + '<TR>'
-            if change.__class__.show_score:
-                node = node + '<TD>' + str(change) + '</TD><TD>' + str(change.get_score()) + '</TD>'
-            else:
-                node = node + '<TD COLSPAN="2">' + str(change) + '</TD>'
-            node = node + '</TR>'
-
-    if 'TABLE' in node:
-        node = node + '</TABLE>>'
-
-    return [node, color]
\ No newline at end of file
+    identifier = node['identifier']
+    if node['kind'] == 'summary':
+        identifier = f"{node['count']} {identifier}"
+    label = '<<TABLE BORDER="0" CELLBORDER="1" CELLSPACING="0">'
+    label = label + '<TR><TD COLSPAN="2">' + identifier + '</TD></TR>'
+    if node.get('unchanged_async_requests'):
+        label = label + f"<TR><TD COLSPAN=\"2\">{node['unchanged_async_requests']} unchanged async requests</TD></TR>"
+
+    for change in node['changes']:
+        label = label + '<TR>'
+        if change['score'] is not None:
+            label = label + '<TD>' + change['name'] + '</TD><TD>' + str(change['score']) + '</TD>'
+        else:
+            label = label + '<TD COLSPAN="2">' + change['name'] + '</TD>'
+        label = label + '</TR>'
+
+    return label + '</TABLE>>'
@@ -0,0 +1,110 @@
+"""
+mitmproxy addon that streams the captured flows to a JSON lines file.
+
+Every completed flow is converted to a HAR entry and appended as one line as soon as its response arrives, so a
+killed proxy loses at most the flow it was writing. Flows that ``is_relevant`` rejects for the crawled application
+are dropped before they are written.
+
+Usage:
+    mitmdump -s src/proxy/capture_addon.py --set capture_file=./har_exports/<name>.jsonl \
+        --set capture_base_url=<url>
+"""
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+from mitmproxy import ctx, http
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.shared.helpers import is_relevant
+
+
+def headers_to_har(headers) -> list:
+    return [{'name': name, 'value': value} for name, value in headers.items(multi=True)]
+
+
+def flow_to_har_entry(flow: http.HTTPFlow) -> dict:
+    """
+    Converts a flow to a HAR entry with the fields mitmproxy's own HAR export writes and the loader reads.
+    """
+    request = flow.request
+    response = flow.response
+    har_request = {
+        'method': request.method,
+        'url': request.pretty_url,
+        'httpVersion': request.http_version,
+        'headers': headers_to_har(request.headers),
+        'queryString': [{'name': name, 'value': value} for name, value in request.query.items(multi=True)],
+        'cookies': [],
+        'headersSize': -1,
+        'bodySize': len(request.raw_content or b''),
+    }
+    if request.raw_content:
+        post_data = {'mimeType': request.headers.get('Content-Type', ''), 'text': request.get_text(strict=False)}
+        if request.urlencoded_form:
+            post_data['params'] = [{'name': name, 'value': value}
+                                   for name, value in request.urlencoded_form.items(multi=True)]
+        har_request['postData'] = post_data
+
+    content = {'size': len(response.raw_content or b''), 'mimeType': response.headers.get('Content-Type', '')}
+    text = response.get_text(strict=False)
+    if text is not None:
+        content['text'] = text
+    har_response = {
+        'status': response.status_code,
+        'statusText': response.reason,
+        'httpVersion': response.http_version,
+        'headers': headers_to_har(response.headers),
+        'cookies': [],
+        'content': content,
+        'redirectURL': response.headers.get('Location', ''),
+        'headersSize': -1,
+        'bodySize': content['size'],
+    }
+    started = datetime.fromtimestamp(request.timestamp_start, timezone.utc)
+    return {
+        'startedDateTime': started.isoformat(),
+        'time': ((response.timestamp_end or request.timestamp_start) - request.timestamp_start) * 1000,
+        'request': har_request,
+        'response': har_response,
+        'cache': {},
+        'timings': {},
+    }
+
+
+class StreamingCapture:
+    """
+    Writes every relevant flow as one HAR entry per line to the file set in the ``capture_file`` option. The file is
+    replaced when the proxy starts, like mitmproxy's hardump, so a new crawl never extends an older capture.
+    """
+
+    def __init__(self):
+        self.file = None
+
+    def load(self, loader):
+        loader.add_option('capture_file', str, '', 'JSON lines file the captured HAR entries are written to.')
+        loader.add_option('capture_base_url', str, '', 'Base URL of the crawled application, other flows are '
+                                                       'dropped.')
+
+    def running(self):
+        if ctx.options.capture_file and self.file is None:
+            self.file = open(ctx.options.capture_file, 'w', encoding='utf-8')
+
+    def response(self, flow: http.HTTPFlow):
+        if self.file is None:
+            return
+        entry = flow_to_har_entry(flow)
+        if not is_relevant(entry, ctx.options.capture_base_url):
+            return
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+    def done(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+addons = [StreamingCapture()]
@@ -1,6 +1,8 @@
 import os
 import subprocess
 
+CAPTURE_ADDON = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'capture_addon.py')
+
 class Proxy:
     """
 
@@ -11,13 +13,17 @@ class Proxy:
     Attributes:
     - filename (str): The name of the dump file to store intercepted network traffic. Default value is 'dump.har'.
     - port (int): The port number on which the proxy will be running. Default value is 8080.
+    - base_url (str): The base URL of the crawled application. Only used for JSON lines captures.
 
     Methods:
-    - __init__(filename: str = 'dump.har', port: int = 8080): Initializes the Proxy object and starts the mitmdump process.
+    - __init__(filename: str = 'dump.har', port: int = 8080, base_url: str = ''): Initializes the Proxy object and starts the mitmdump process.
         Parameters:
             - filename (str): The name of the dump file to store intercepted network traffic. Default value is 'dump.har'.
+              A '.jsonl' file is written by the capture addon entry by entry while crawling and only receives the
+              flows relevant for base_url. Any other file is written as HAR file when the proxy stops.
             - port (int): The port number on which the proxy will be running. Default value is 8080.
-    - stop(): Stops the running proxy by terminating the mitmdump process.
+            - base_url (str): The base URL of the crawled application.
+    - stop(): Stops the running proxy by terminating the mitmdump process and waits until it has written its capture.
 
     Example usage:
     proxy = Proxy()
@@ -25,10 +31,15 @@ class Proxy:
     proxy.stop()
 
     """
-    def __init__(self, filename : str = 'dump.har', port : int = 8080):
-        cmd = f"mitmdump  --set hardump={filename} -p {port}"
+    def __init__(self, filename : str = 'dump.har', port : int = 8080, base_url : str = ''):
+        if filename.endswith('.jsonl'):
+            cmd = f'mitmdump -s "{CAPTURE_ADDON}" --set capture_file="{filename}" ' \
+                  f'--set capture_base_url="{base_url}" -p {port}'
+        else:
+            cmd = f"mitmdump  --set hardump={filename} -p {port}"
         self.process = subprocess.Popen(cmd, shell=True)
 
     def stop(self):
         self.process.terminate()
+        self.process.wait()
 
@@ -0,0 +1,71 @@
+import os
+import shutil
+import subprocess
+import threading
+from typing import Callable, List
+
+from src.proxy.proxy import Proxy
+from src.snapshot.har_reader import merge_captures
+
+
+def split_seeds(seeds: List[str], shards: int) -> List[List[str]]:
+    """
+    Distributes the start URLs round robin over the shards. There are never more shards than start URLs.
+    """
+    shards = max(1, min(shards, len(seeds)))
+    return [seeds[shard::shards] for shard in range(shards)]
+
+
+def run_sharded_crawl(crawl_command: Callable[[str, int], str], name: str, base_url: str, seeds: List[str],
+                      shards: int, first_port: int, snapshot_directory: str) -> int:
+    """
+    Crawls an application with several crawler and proxy pairs at once and merges their captures.
+
+    Shard i runs its own proxy on port first_port + i and crawls its slice of the start URLs one after another. The
+    shards capture into <snapshot_directory>/shards/<name>/, and once all crawlers have exited the captures are
+    merged into <name>.jsonl, see merge_captures.
+
+    Parameters:
+    - crawl_command (Callable[[str, int], str]): Returns the shell command that crawls a start URL through the proxy
+      on the given port.
+    - name (str): The name of the snapshot.
+    - base_url (str): The base URL of the application, written to <name>.domain.txt.
+    - seeds (List[str]): The start URLs, e.g. the entry pages of the sections of the application.
+    - shards (int): The number of crawler and proxy pairs.
+    - first_port (int): The proxy port of the first shard.
+    - snapshot_directory (str): The directory of the snapshots.
+
+    Returns:
+    - int: The number of captured entries.
+    """
+    shard_directory = os.path.join(snapshot_directory, 'shards', name)
+    shutil.rmtree(shard_directory, ignore_errors=True)
+    os.makedirs(shard_directory)
+    with open(os.path.join(snapshot_directory, name + '.domain.txt'), 'w') as f:
+        f.write(base_url)
+
+    shard_seeds = split_seeds(seeds, shards)
+    shard_files = [os.path.join(shard_directory, f'{shard}.jsonl') for shard in range(len(shard_seeds))]
+
+    def crawl_shard(shard: int):
+        port = first_port + shard
+        proxy = Proxy(shard_files[shard], port, base_url)
+        try:
+            for seed in shard_seeds[shard]:
+                print(f'shard {shard}: crawling {seed} through proxy port {port}')
+                subprocess.run(crawl_command(seed, port), shell=True)
+        finally:
+            proxy.stop()
+
+    threads = [threading.Thread(target=crawl_shard, args=(shard,), name=f'crawl-shard-{shard}')
+               for shard in range(len(shard_seeds))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    count = merge_captures(shard_files, os.path.join(snapshot_directory, name + '.jsonl'))
+    shutil.rmtree(shard_directory, ignore_errors=True)
+    if not os.listdir(os.path.dirname(shard_directory)):
+        os.rmdir(os.path.dirname(shard_directory))
+    return count
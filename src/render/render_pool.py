@@ -0,0 +1,102 @@
+import itertools
+import os
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from selenium import webdriver
+
+DEFAULT_WINDOW_SIZE = (1920, 1080)
+DEFAULT_FLAGS = ['--disable-web-security', '--disable-xss-auditor', '--timeout=5', '--disable-javascript',
+                 '--hide-scrollbars']
+
+
+class RenderPool:
+    """
+    Pool of long-lived headless Chrome instances that render HTML bodies to PNG files.
+
+    Every worker thread owns one browser, which is started on the first job of the thread and reused until the pool
+    is closed. Each job renders into its own file, so jobs of one pool, and of pools in other processes, never
+    overwrite each other's output.
+
+    Attributes:
+        output_dir (str): Directory for the rendered images and the temporary HTML files.
+        size (int): Number of browsers rendering in parallel.
+        window_size (tuple): Width and height of the browser window.
+        flags (list): Command line flags passed to Chrome.
+
+    Methods:
+        render(html_bodies): Renders the given HTML bodies and returns the image paths in the same order.
+        settings(): Returns a string describing the render settings, e.g. for cache keys.
+        close(): Quits all browsers.
+
+    Example usage:
+        with RenderPool('./tmp/') as render_pool:
+            image1, image2 = render_pool.render([html1, html2])
+    """
+
+    def __init__(self, output_dir: str = './tmp/', size: int = 2, window_size: tuple = DEFAULT_WINDOW_SIZE,
+                 flags: List[str] = None):
+        self.output_dir = output_dir
+        self.size = size
+        self.window_size = window_size
+        self.flags = flags if flags is not None else DEFAULT_FLAGS
+        self.drivers = []
+        self.drivers_lock = threading.Lock()
+        self.local = threading.local()
+        self.job_counter = itertools.count()
+        self.executor = ThreadPoolExecutor(max_workers=size, initializer=self.start_browser)
+        os.makedirs(output_dir, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def settings(self) -> str:
+        return f'chrome {self.window_size[0]}x{self.window_size[1]} {" ".join(sorted(self.flags))}'
+
+    def start_browser(self):
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless')
+        options.add_argument(f'--window-size={self.window_size[0]},{self.window_size[1]}')
+        for flag in self.flags:
+            options.add_argument(flag)
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.javascript': 2})
+        driver = webdriver.Chrome(options=options)
+        self.local.driver = driver
+        with self.drivers_lock:
+            self.drivers.append(driver)
+
+    def render(self, html_bodies: List[str]) -> List[str]:
+        """
+        Renders a batch of HTML bodies in parallel.
+
+        Parameters:
+        - html_bodies (List[str]): The HTML documents to render.
+
+        Returns:
+        - List[str]: Paths of the PNG files, in the order of the given bodies. The caller owns the files.
+        """
+        jobs = [f'render_{os.getpid()}_{next(self.job_counter)}' for _ in html_bodies]
+        return list(self.executor.map(self.render_job, jobs, html_bodies))
+
+    def render_job(self, job: str, html_body: str) -> str:
+        html_path = pathlib.Path(self.output_dir, job + '.html').resolve()
+        image_path = os.path.join(self.output_dir, job + '.png')
+        html_path.write_text(html_body, encoding='utf-8')
+        try:
+            self.local.driver.get(html_path.as_uri())
+            self.local.driver.save_screenshot(image_path)
+        finally:
+            html_path.unlink()
+        return image_path
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        with self.drivers_lock:
+            for driver in self.drivers:
+                driver.quit()
+            self.drivers = []
@@ -0,0 +1,117 @@
+import contextlib
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+from typing import Iterable, Tuple
+
+
+# seconds for which an image returned by get or put is protected from eviction unless it is released earlier
+LEASE_SECONDS = 600
+
+
+class ScreenshotCache:
+    """
+    Persistent, content-addressed cache of rendered screenshots and their dHash values.
+
+    Entries are keyed by a hash of the HTML body and the render settings, so an unchanged page is rendered only once
+    across all compare runs. The index lives in a SQLite database next to the images, which makes the cache safe to
+    share between the worker processes of a parallel compare run. When the images exceed the size cap, the least
+    recently used entries are evicted. An image returned by get or put is leased until it is released or the lease
+    expires, and leased images are never evicted, so a caller can still copy it while other keys of its batch or
+    other processes fill the cache. The total size of the images is kept in the index as well.
+
+    Attributes:
+        directory (str): Directory holding the images and the index.
+        max_size (int): Size cap of the cached images in bytes.
+
+    Methods:
+        key(html, settings): Returns the cache key of an HTML body rendered with the given settings.
+        get(key): Returns the cached (dhash, image path) of the key or None, and leases the entry.
+        put(key, dhash, image_path): Moves the rendered image into the cache, leases it and returns its new path.
+        release(image_paths): Ends the leases of images returned by get or put.
+    """
+
+    def __init__(self, directory: str = './cache/screenshots/', max_size_mb: int = 1024):
+        self.directory = directory
+        self.max_size = max_size_mb * 1024 * 1024
+        self.index_path = os.path.join(directory, 'index.sqlite')
+        os.makedirs(directory, exist_ok=True)
+        with self.connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                               '(key TEXT PRIMARY KEY, dhash TEXT, size INTEGER, last_used REAL, '
+                               'leased_until REAL DEFAULT 0)')
+            columns = [row[1] for row in connection.execute('PRAGMA table_info(entries)')]
+            if 'leased_until' not in columns:
+                connection.execute('ALTER TABLE entries ADD COLUMN leased_until REAL DEFAULT 0')
+            connection.execute('CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER)')
+            # caches written before the total was kept start from the sum of their entries
+            connection.execute("INSERT OR IGNORE INTO totals SELECT 'size', COALESCE(SUM(size), 0) FROM entries")
+
+    @contextlib.contextmanager
+    def connect(self):
+        connection = sqlite3.connect(self.index_path, timeout=60)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def key(html: str, settings: str) -> str:
+        return hashlib.sha256((settings + '\0' + html).encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def image_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.png')
+
+    def get(self, key: str) -> Tuple[str, str] | None:
+        with self.connect() as connection:
+            now = time.time()
+            # the update takes the write lock first, so no other process evicts the entry before it is leased
+            updated = connection.execute('UPDATE entries SET last_used = ?, leased_until = ? WHERE key = ?',
+                                         (now, now + LEASE_SECONDS, key)).rowcount
+            if not updated:
+                return None
+            row = connection.execute('SELECT dhash, size FROM entries WHERE key = ?', (key,)).fetchone()
+            if not os.path.exists(self.image_path(key)):
+                self.delete(connection, key, row[1])
+                return None
+        return row[0], self.image_path(key)
+
+    def put(self, key: str, dhash: str, image_path: str) -> str:
+        cached_path = self.image_path(key)
+        shutil.move(image_path, cached_path)
+        size = os.path.getsize(cached_path)
+        with self.connect() as connection:
+            now = time.time()
+            # another process may have cached the same key meanwhile
+            previous = connection.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                               (key, dhash, size, now, now + LEASE_SECONDS))
+            connection.execute("UPDATE totals SET value = value + ? WHERE name = 'size'",
+                               (size - (previous[0] if previous else 0),))
+            self.evict(connection, now)
+        return cached_path
+
+    def release(self, image_paths: Iterable[str]):
+        keys = [(os.path.splitext(os.path.basename(image_path))[0],) for image_path in image_paths]
+        with self.connect() as connection:
+            connection.executemany('UPDATE entries SET leased_until = 0 WHERE key = ?', keys)
+
+    def delete(self, connection: sqlite3.Connection, key: str, size: int):
+        connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+        connection.execute("UPDATE totals SET value = value - ? WHERE name = 'size'", (size,))
+
+    def evict(self, connection: sqlite3.Connection, now: float):
+        total_size = connection.execute("SELECT value FROM totals WHERE name = 'size'").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+        for key, size in connection.execute('SELECT key, size FROM entries WHERE leased_until <= ? '
+                                            'ORDER BY last_used', (now,)).fetchall():
+            self.delete(connection, key, size)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.image_path(key))
+            total_size -= size
+            if total_size <= self.max_size:
+                return
@@ -1,67 +1,162 @@
-from src.entity.Request import AsyncRequest
+import io
+import sys
+from typing import TextIO
+
 from src.entity.Snapshot import Snapshot
 from src.shared.helpers import is_change_in_request
 from src.entity.Change import NewRequestChange, MissingRequestChange
+from src.entity.CompareStatistics import CompareStatistics
+from src.snapshot.timeline import Timeline, TimelineEntry
+from src.report.report_writer import REPORT_WRITERS, format_request_changes
 
 
-def generate_report(snapshot: Snapshot, snapshot2: Snapshot, filename: str = ''):
+def generate_report(snapshot: Snapshot, snapshot2: Snapshot, filename: str = '', statistics: CompareStatistics = None,
+                    report_format: str = 'text'):
     """
     Generates a report based on two snapshot objects and writes it to a file if a filename is provided.
 
+    The changes are written to the file request by request while the snapshots are walked, so memory use does not
+    depend on the size of the report.
+
     Parameters:
     - snapshot (Snapshot): The first snapshot object
     - snapshot2 (Snapshot): The second snapshot object
     - filename (str, optional): The filename to write the report to (default is an empty string)
+    - statistics (CompareStatistics, optional): The counters returned by compare_snapshots, added as a summary line
+    - report_format (str, optional): One of 'text', 'jsonl', 'csv' and 'html' (default is 'text')
 
     Returns:
-    - str: The generated report
+    - str: The generated report if no filename is provided, otherwise an empty string
+
+    """
+    if not filename:
+        file = io.StringIO()
+        write_report(snapshot, snapshot2, file, statistics, report_format)
+        return file.getvalue()
+    with open(filename, 'w', newline='' if report_format == 'csv' else None) as file:
+        write_report(snapshot, snapshot2, file, statistics, report_format)
+    return ''
 
+
+def write_report(snapshot: Snapshot, snapshot2: Snapshot, file: TextIO, statistics: CompareStatistics = None,
+                 report_format: str = 'text'):
+    """
+    Writes the changes found in snapshot 1 and the new requests of snapshot 2 to an open file, see generate_report.
     """
-    report = ''
-    report += f'========= Snapshot 1 =========\n'
+    writer = REPORT_WRITERS[report_format](file)
+    writer.begin()
+    writer.section(1)
     for static_request in snapshot.static_requests:
         if len(static_request.changes):
-            report += print_request_changes(static_request)
+            writer.request(static_request, 1)
         for async_request in static_request.async_requests:
             if len(async_request.changes):
-                report += print_request_changes(async_request)
-
-    report_snapshot2 = ''
-    report_snapshot2 += f'\n========= Snapshot 2 =========\n'
+                writer.request(async_request, 1)
 
+    writer.section(2)
     for static_request in snapshot2.static_requests:
         if is_change_in_request(static_request, NewRequestChange):
-            report_snapshot2 += print_request_changes(static_request)
+            writer.request(static_request, 2)
 
         for async_request in static_request.async_requests:
             if is_change_in_request(async_request, NewRequestChange):
-                report_snapshot2 += print_request_changes(async_request)
+                writer.request(async_request, 2)
 
-    if report == '':
-        report = 'No changes found'
+    if statistics:
+        writer.statistics(statistics)
+    writer.end()
 
-    if not report_snapshot2 == '':
-        report += report_snapshot2
 
+def generate_timeline_report(timeline: Timeline, filename: str = ''):
+    """
+    Generates a report of the change history of a series of snapshots and writes it to a file if a filename is
+    provided.
+
+    Parameters:
+    - timeline (Timeline): The timeline returned by compare_timeline
+    - filename (str, optional): The filename to write the report to (default is an empty string)
+
+    Returns:
+    - str: The generated report
+
+    """
+    lines = [f'========= Timeline: {" -> ".join(timeline.snapshot_names)} =========\n',
+             f'Baseline: {timeline.snapshot_names[0]}\n\n']
+    entries_by_page = {}
+    for entry in timeline.entries.values():
+        entries_by_page.setdefault(entry.static_identifier, {}).setdefault(entry.identifier, []).append(entry)
+    for static_identifier, entries_by_identifier in entries_by_page.items():
+        lines.append(f"Static URL: {static_identifier.replace('&amp;', '&')}\n")
+        for entry in entries_by_identifier.pop(static_identifier, []):
+            lines.append(print_timeline_entry(entry))
+        for identifier, entries in entries_by_identifier.items():
+            lines.append(f"Async URL: {identifier.replace('&amp;', '&')}\n")
+            for entry in entries:
+                lines.append(print_timeline_entry(entry))
+        lines.append("\n")
+
+    if not timeline.entries:
+        lines.append('No changes found\n')
+
+    report = ''.join(lines)
     if filename:
-        file = open(filename, 'w')
-        file.write(report)
-        file.close()
+        with open(filename, 'w') as file:
+            file.write(report)
     return report
 
-def list_requests(snapshot: Snapshot, filename: str = ''):
+
+def print_timeline_entry(entry: TimelineEntry):
+    """
+    Print the history of one change of a request.
+
+    Parameters:
+    - entry: The TimelineEntry to print.
+
+    Returns:
+    - report: A string containing the snapshots the change was found in and its latest notice.
+
+    """
+    lines = [f"{entry.change_name}: first seen in {entry.first_seen() or '-'}",
+             f"; vs baseline in {', '.join(entry.vs_baseline) or '-'}",
+             f"; vs previous in {', '.join(entry.vs_previous) or '-'}\n"]
+    change = entry.last_change
+    if change:
+        lines.append("\tlatest")
+        if change.__class__.show_score:
+            lines.append(f" ({change.get_score()})")
+        notice = change.notice
+        if type(notice) is str:
+            notice = '\n\t\t'.join(notice.split('\n'))
+        lines.append(f": {notice}\n")
+    return ''.join(lines)
+
+
+def list_requests(snapshot: Snapshot, filename: str = '') -> int:
     """
     Generates a report of requests from a given snapshot.
 
     Parameters:
     - snapshot (Snapshot): The snapshot object containing the requests.
-    - filename (str, optional): The filename to save the report. If provided, the report will be saved to the file.
+    - filename (str, optional): The filename to save the report. If provided, the report will be saved to the file,
+      otherwise it is printed.
 
     Returns:
-    - report (str): The generated report.
+    - count (int): The number of requests.
 
     """
-    report = 'METHOD; IDENTIFIER; REQUEST TYPE\n'
+    if not filename:
+        count = write_request_list(snapshot, sys.stdout)
+        sys.stdout.write('\n')
+        return count
+    with open(filename + '.csv', 'w') as file:
+        return write_request_list(snapshot, file)
+
+
+def write_request_list(snapshot: Snapshot, file: TextIO) -> int:
+    """
+    Writes one line per request of the snapshot to an open file, see list_requests.
+    """
+    file.write('METHOD; IDENTIFIER; REQUEST TYPE\n')
     split_identifier = ''
     count = 0
     for static_request in snapshot.static_requests:
@@ -71,7 +166,7 @@ def list_requests(snapshot: Snapshot, filename: str = ''):
             split_identifier = identifier.replace('POST', 'POST; ')
         if 'GET' in identifier:
             split_identifier = identifier.replace('GET', 'GET; ')
-        report += split_identifier + '; static\n'
+        file.write(split_identifier + '; static\n')
         for async_request in static_request.async_requests:
             count+=1
             identifier = async_request.identifier
@@ -79,13 +174,9 @@ def list_requests(snapshot: Snapshot, filename: str = ''):
                 split_identifier = identifier.replace('POST', 'POST; ')
             if 'GET' in identifier:
                 split_identifier = identifier.replace('GET', 'GET; ')
-            report += '\t' + split_identifier + '; async\n'
-    report += 'Count: ' + str(count)
-    if filename:
-        file = open(filename + '.csv', 'w')
-        file.write(report)
-        file.close()
-    return report
+            file.write('\t' + split_identifier + '; async\n')
+    file.write('Count: ' + str(count))
+    return count
 
 
 def print_request_changes(request):
@@ -99,24 +190,4 @@ def print_request_changes(request):
     - report: A string containing the formatted report of the changes made in the request.
 
     """
-    report = ''
-    t = 'Static'
-    if type(request) is AsyncRequest:
-        t = 'Async'
-
-    report += f"{t} URL: {request.identifier.replace('&amp;', '&')}\n"
-    #report += f"\n"
-    for change in request.changes:
-        report += f"{change}"
-        if change.__class__.show_score:
-            report += f" ({change.get_score()})"
-
-        reformatted_notice = change.notice
-        if type(reformatted_notice) is str:
-            reformatted_notice = '\n\t'.join(change.notice.split('\n'))
-        report += f": {reformatted_notice}\n"
-    report += f"\n"
-    report += f"\n"
-    return report
-
-
+    return format_request_changes(request)
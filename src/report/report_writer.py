@@ -0,0 +1,190 @@
+import csv
+import html
+import json
+from typing import TextIO
+
+from src.entity.Change import Change
+from src.entity.CompareStatistics import CompareStatistics
+from src.entity.Request import AsyncRequest, Request
+
+
+def request_type(request: Request) -> str:
+    return 'Async' if type(request) is AsyncRequest else 'Static'
+
+
+def change_score(change: Change) -> float | None:
+    return change.get_score() if change.__class__.show_score else None
+
+
+def change_notice(change: Change) -> str:
+    return change.notice if type(change.notice) is str else str(change.notice)
+
+
+class ReportWriter:
+    """
+    Writes the changes of a comparison to a file handle while they are produced, so neither the report nor a part
+    of it larger than one request is ever held in memory.
+
+    Methods:
+        begin(): Writes everything before the first section.
+        section(snapshot_number): Starts the changes of snapshot 1 or snapshot 2.
+        request(request, snapshot_number): Writes a request and its changes.
+        statistics(statistics): Writes the comparison counters.
+        end(): Writes everything after the last request.
+    """
+    extension = 'txt'
+
+    def __init__(self, file: TextIO):
+        self.file = file
+
+    def begin(self):
+        return
+
+    def section(self, snapshot_number: int):
+        return
+
+    def request(self, request: Request, snapshot_number: int):
+        return
+
+    def statistics(self, statistics: CompareStatistics):
+        return
+
+    def end(self):
+        return
+
+
+class TextReportWriter(ReportWriter):
+    """
+    Writes the plain text report, one block per request.
+    """
+    extension = 'txt'
+
+    def section(self, snapshot_number: int):
+        if snapshot_number == 2:
+            self.file.write('\n')
+        self.file.write(f'========= Snapshot {snapshot_number} =========\n')
+
+    def request(self, request: Request, snapshot_number: int):
+        self.file.write(format_request_changes(request))
+
+    def statistics(self, statistics: CompareStatistics):
+        self.file.write(f'\nSkipped content comparisons (identical content): {statistics.skipped_comparisons} of '
+                        f'{statistics.total()}\n')
+
+
+class JsonLinesReportWriter(ReportWriter):
+    """
+    Writes one JSON object per change, and the comparison counters as last object.
+    """
+    extension = 'jsonl'
+
+    def request(self, request: Request, snapshot_number: int):
+        for change in request.changes:
+            self.file.write(json.dumps({
+                'snapshot': snapshot_number,
+                'type': request_type(request).lower(),
+                'identifier': request.identifier.replace('&amp;', '&'),
+                'change': str(change),
+                'score': change_score(change),
+                'notice': change_notice(change),
+            }) + '\n')
+
+    def statistics(self, statistics: CompareStatistics):
+        self.file.write(json.dumps({'statistics': {'comparisons': statistics.comparisons,
+                                                   'skipped_comparisons': statistics.skipped_comparisons}}) + '\n')
+
+
+class CsvReportWriter(ReportWriter):
+    """
+    Writes one row per change. The comparison counters are left out to keep the table rectangular.
+    """
+    extension = 'csv'
+    columns = ['snapshot', 'type', 'identifier', 'change', 'score', 'notice']
+
+    def __init__(self, file: TextIO):
+        super().__init__(file)
+        self.writer = csv.writer(file)
+
+    def begin(self):
+        self.writer.writerow(self.columns)
+
+    def request(self, request: Request, snapshot_number: int):
+        for change in request.changes:
+            score = change_score(change)
+            self.writer.writerow([snapshot_number, request_type(request).lower(),
+                                  request.identifier.replace('&amp;', '&'), str(change),
+                                  '' if score is None else score, change_notice(change).strip()])
+
+
+class HtmlReportWriter(ReportWriter):
+    """
+    Writes a self-contained HTML page with one table per snapshot, without external styles or scripts.
+    """
+    extension = 'html'
+    style = ('body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;width:100%;margin-bottom:2em}'
+             'th,td{border:1px solid #ccc;padding:4px 8px;text-align:left;vertical-align:top}th{background:#eee}'
+             'pre{margin:0;white-space:pre-wrap}.MissingRequestChange{background:#fdd}'
+             '.NewRequestChange{background:#dfd}')
+
+    def __init__(self, file: TextIO):
+        super().__init__(file)
+        self.open_table = False
+
+    def begin(self):
+        self.file.write(f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>scrooge report</title>'
+                        f'<style>{self.style}</style></head><body>\n')
+
+    def section(self, snapshot_number: int):
+        self.close_table()
+        self.file.write(f'<h2>Snapshot {snapshot_number}</h2>\n<table><tr><th>Type</th><th>URL</th><th>Change</th>'
+                        f'<th>Score</th><th>Notice</th></tr>\n')
+        self.open_table = True
+
+    def request(self, request: Request, snapshot_number: int):
+        identifier = html.escape(request.identifier.replace('&amp;', '&'))
+        for change in request.changes:
+            score = change_score(change)
+            self.file.write(f'<tr class="{html.escape(str(change))}"><td>{request_type(request)}</td>'
+                            f'<td>{identifier}</td><td>{html.escape(str(change))}</td>'
+                            f'<td>{"" if score is None else score}</td>'
+                            f'<td><pre>{html.escape(change_notice(change).strip())}</pre></td></tr>\n')
+
+    def statistics(self, statistics: CompareStatistics):
+        self.close_table()
+        self.file.write(f'<p>Skipped content comparisons (identical content): {statistics.skipped_comparisons} of '
+                        f'{statistics.total()}</p>\n')
+
+    def end(self):
+        self.close_table()
+        self.file.write('</body></html>\n')
+
+    def close_table(self):
+        if self.open_table:
+            self.file.write('</table>\n')
+            self.open_table = False
+
+
+REPORT_WRITERS = {
+    'text': TextReportWriter,
+    'jsonl': JsonLinesReportWriter,
+    'csv': CsvReportWriter,
+    'html': HtmlReportWriter,
+}
+
+
+def format_request_changes(request: Request) -> str:
+    """
+    Formats a request and its changes as block of the text report.
+    """
+    lines = [f"{request_type(request)} URL: {request.identifier.replace('&amp;', '&')}\n"]
+    for change in request.changes:
+        line = f"{change}"
+        if change.__class__.show_score:
+            line += f" ({change.get_score()})"
+
+        reformatted_notice = change.notice
+        if type(reformatted_notice) is str:
+            reformatted_notice = '\n\t'.join(change.notice.split('\n'))
+        lines.append(f"{line}: {reformatted_notice}\n")
+    lines.append("\n\n")
+    return ''.join(lines)
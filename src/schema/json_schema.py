@@ -1,7 +1,16 @@
 from genson import SchemaBuilder
+import hashlib
 import json
 from urllib.parse import parse_qs
-import jsondiff
+
+MAX_ARRAY_SAMPLES = 32
+SCHEMA_CACHE_SIZE = 4096
+
+# schemas of sampled data, keyed by json_structure
+schema_cache = {}
+
+# schema keywords whose list values have no meaningful order
+UNORDERED_KEYWORDS = {'type', 'required', 'anyOf', 'oneOf', 'allOf', 'enum'}
 
 
 def create_json_schema(data: dict):
@@ -19,25 +28,111 @@ def create_json_schema(data: dict):
     return builder.to_schema()
 
 
-def create_content_json_schema(request: dict) -> dict:
+def sample_json(data, max_items: int = MAX_ARRAY_SAMPLES):
+    """
+    Returns a copy of the data in which arrays longer than ``max_items`` are replaced by evenly spaced samples,
+    always including the first and the last element.
+
+    :param data: The decoded JSON data.
+    :param max_items: Maximum number of elements kept per array.
+    :return: The sampled data.
+    """
+    if isinstance(data, dict):
+        return {key: sample_json(value, max_items) for key, value in data.items()}
+    if isinstance(data, list):
+        if len(data) > max_items:
+            step = (len(data) - 1) / (max_items - 1)
+            data = [data[round(i * step)] for i in range(max_items)]
+        return [sample_json(item, max_items) for item in data]
+    return data
+
+
+def json_structure(data):
+    """
+    Returns a hashable description of the structure of the data: object keys, array element structures and value
+    types, but no values. Data with the same structure yields the same schema.
+
+    :param data: The decoded (and sampled) JSON data.
+    :return: The structure as nested tuples.
     """
-    Function that creates a JSON schema from the content of a request.
+    if isinstance(data, dict):
+        return 'object', tuple(sorted((key, json_structure(value)) for key, value in data.items()))
+    if isinstance(data, list):
+        return 'array', frozenset(json_structure(item) for item in data)
+    return type(data).__name__
+
+
+def infer_json_schema(data, schema: dict = None, seen_structures: set = None) -> dict:
+    """
+    Infers the JSON schema of the data and merges it into the schema of earlier samples of the same endpoint.
+
+    Large arrays are sampled first. Schemas of new data are memoized by the structure of the data, and samples whose
+    structure is in ``seen_structures`` are skipped, because they cannot change the merged schema.
+
+    :param data: The decoded JSON data.
+    :type data: Any
+    :param schema: The schema of the earlier samples, if any.
+    :type schema: dict
+    :param seen_structures: The structures already merged into ``schema``, updated in place.
+    :type seen_structures: set
+    :return: The schema covering the earlier samples and the data.
+    :rtype: dict
+    """
+    data, structure = prepare_json_sample(data)
+    return merge_json_sample(data, structure, schema, seen_structures)
+
+
+def prepare_json_sample(data) -> tuple:
+    """
+    Samples large arrays of the data and returns the sampled data with its structure. This is the part of
+    infer_json_schema that only depends on the data itself.
+
+    :param data: The decoded JSON data.
+    :return: The sampled data and its json_structure.
+    :rtype: tuple
+    """
+    data = sample_json(data)
+    return data, json_structure(data)
+
+
+def merge_json_sample(data, structure, schema: dict = None, seen_structures: set = None) -> dict:
+    """
+    Merges data prepared by prepare_json_sample into the schema of earlier samples, see infer_json_schema.
+    """
+    if seen_structures is not None:
+        if structure in seen_structures:
+            return schema
+        seen_structures.add(structure)
+
+    if not schema:
+        cached_schema = schema_cache.get(structure)
+        if cached_schema is None:
+            if len(schema_cache) >= SCHEMA_CACHE_SIZE:
+                schema_cache.clear()
+            cached_schema = create_json_schema(data)
+            schema_cache[structure] = cached_schema
+        return cached_schema
+
+    builder = SchemaBuilder()
+    builder.add_schema(schema)
+    builder.add_object(data)
+    return builder.to_schema()
+
+
+def parse_request_json(request: dict):
+    """
+    Decodes the form parameters of a request into a dictionary of value lists.
 
     Args:
-        request (dict): The request object containing response content.
+        request (dict): The request object containing the post data.
 
     Returns:
-        dict: The JSON schema created from the content, or an empty dictionary if the content is invalid JSON.
+        The parameters, or None if the request has no form parameters.
     """
-    try:
-        if 'text' in request['response']['content']:
-            data = json.loads(request['response']['content']['text'])
-            return create_json_schema(data)
+    if 'postData' in request['request'] and 'params' in request['request']['postData']:
+        return parse_qs(request['request']['postData']['text'])
 
-    except json.decoder.JSONDecodeError:
-        print("Invalid JSON", request)
-
-    return {}
+    return None
 
 
 def create_request_json_schema(request: dict) -> dict:
@@ -53,24 +148,15 @@ def create_request_json_schema(request: dict) -> dict:
 
 
     This method takes a `request` object as input and checks if it contains 'postData' and 'params' keys.
-    If it does, it parses the data and creates a JSON schema using the `create_json_schema` function.
-    If there is any error in decoding the JSON data, an "Invalid JSON" message is printed.
+    If it does, it parses the data and creates a JSON schema using the `infer_json_schema` function.
 
     The method returns the JSON schema for the request data if it exists, otherwise an empty dictionary is returned.
 
     """
-    try:
-        if 'postData' in request['request'] and 'params' in request['request']['postData']:
-            data = json.dumps(parse_qs(request['request']['postData']['text']))
-            # data = data.replace("'", "\"")
-            data = json.loads(data)
-
-            return create_json_schema(data)
-
-    except json.decoder.JSONDecodeError:
-        print("Invalid JSON")
-
-    return {}
+    data = parse_request_json(request)
+    if data is None:
+        return {}
+    return infer_json_schema(data)
 
 
 def visualize_schema(schema: dict, depth=0) -> None:
@@ -110,15 +196,95 @@ def compare_schema(schema1: dict, schema2: dict) -> bool:
     return schema1 == schema2
 
 
-def json_compare(schema1: dict, schema2: dict) -> str:
+def canonical_schema(schema):
+    """
+    Brings a JSON schema into a canonical form, in which lists without meaningful order ('type', 'required',
+    'anyOf', ...) are sorted, so that equal schemas have equal serializations.
+
+    :param schema: The JSON schema or a part of it.
+    :return: The canonical schema.
+    """
+    if isinstance(schema, dict):
+        return {key: canonical_schema(value) if key not in UNORDERED_KEYWORDS
+                else sorted((canonical_schema(item) for item in value), key=canonical_json)
+                if isinstance(value, list) else canonical_schema(value)
+                for key, value in schema.items()}
+    if isinstance(schema, list):
+        return [canonical_schema(item) for item in schema]
+    return schema
+
+
+def canonical_json(schema) -> str:
+    return json.dumps(schema, sort_keys=True, separators=(',', ':'))
+
+
+def schema_hash(schema: dict) -> str:
     """
-    Compare two JSON schemas and return the differences.
+    Returns a hash of the JSON schema that does not depend on key order or the order of unordered lists.
 
-    :param schema1: The first JSON schema to compare.
+    :param schema: The JSON schema.
+    :type schema: dict
+    :return: The hex digest of the canonical schema.
+    :rtype: str
+    """
+    return hashlib.sha256(canonical_json(canonical_schema(schema or {})).encode('utf-8')).hexdigest()
+
+
+def schema_types(schema: dict) -> dict:
+    """
+    Returns the types allowed by a schema node, each mapped to the (sub)schema describing it.
+    """
+    types = {}
+    for branch in schema.get('anyOf', [schema]):
+        branch_types = branch.get('type', [])
+        for schema_type in [branch_types] if isinstance(branch_types, str) else branch_types:
+            types[schema_type] = branch
+    return types
+
+
+def diff_json_schema(schema1: dict, schema2: dict) -> list:
+    """
+    Compares two JSON schemas property by property.
+
+    :param schema1: The schema of snapshot 1.
     :type schema1: dict
-    :param schema2: The second JSON schema to compare.
+    :param schema2: The schema of snapshot 2.
     :type schema2: dict
-    :return: The differences between the two JSON schemas.
-    :rtype: str
+    :return: One line per added, removed, retyped, newly required or newly optional property, addressed by its JSON
+        path, e.g. 'retyped: $.items[].id: integer -> string'.
+    :rtype: list
     """
-    return jsondiff.diff(schema1, schema2)
\ No newline at end of file
+    differences = []
+    stack = [(schema1 or {}, schema2 or {}, '$')]
+    while stack:
+        node1, node2, path = stack.pop()
+        types1, types2 = schema_types(node1), schema_types(node2)
+        if set(types1) != set(types2):
+            differences.append(f"retyped: {path}: {format_types(types1)} -> {format_types(types2)}")
+
+        if 'object' in types1 and 'object' in types2:
+            properties1 = types1['object'].get('properties', {})
+            properties2 = types2['object'].get('properties', {})
+            required1 = set(types1['object'].get('required', []))
+            required2 = set(types2['object'].get('required', []))
+            for name in sorted(properties1.keys() - properties2.keys()):
+                differences.append(f"removed: {path}.{name}")
+            for name in sorted(properties2.keys() - properties1.keys()):
+                differences.append(f"added: {path}.{name} ({format_types(schema_types(properties2[name]))})")
+            for name in sorted(properties1.keys() & properties2.keys(), reverse=True):
+                if name in required1 and name not in required2:
+                    differences.append(f"optional: {path}.{name}")
+                elif name in required2 and name not in required1:
+                    differences.append(f"required: {path}.{name}")
+                stack.append((properties1[name], properties2[name], f"{path}.{name}"))
+
+        if 'array' in types1 and 'array' in types2:
+            items1 = types1['array'].get('items', {})
+            items2 = types2['array'].get('items', {})
+            if isinstance(items1, dict) and isinstance(items2, dict):
+                stack.append((items1, items2, f"{path}[]"))
+    return differences
+
+
+def format_types(types: dict) -> str:
+    return '|'.join(sorted(types)) or 'any'
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+
+from src.shared.metrics import metrics
+
+BLOB_DIRECTORY = 'blobs'
+
+
+def blob_key(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def blob_path(directory: str, key: str) -> str:
+    return os.path.join(directory, key[:2], key)
+
+
+class BlobStore:
+    """
+    Content-addressed store of response bodies.
+
+    Every body is kept once, keyed by the SHA-256 of its text, no matter how many requests of how many snapshots share
+    it. Requests only hold the key. On disk, the bodies are zlib-compressed files under <directory>/<key[:2]>/<key>
+    that are written once and shared by all compiled snapshots of a snapshot directory, so a snapshot of a mostly
+    unchanged application only adds the bodies that changed.
+
+    Bodies are held in memory only until they are saved. Afterwards they are read from disk when they are accessed,
+    and only the cache_size most recently used ones are kept, so several large snapshots fit into one process.
+
+    Methods:
+        put(text): Stores a body and returns its key.
+        get(key): Returns the body of a key.
+        save(keys, directory): Writes the bodies of the keys that are not on disk yet and drops them from memory.
+        attach(keys, directory): Reads the bodies of the keys from directory from now on.
+        release(keys): Drops bodies that were put for a single task.
+    """
+    blobs: Dict[str, str]
+    directories: List[str]
+
+    def __init__(self, cache_size: int = 64):
+        # bodies that are not on disk yet
+        self.blobs = {}
+        self.directories = []
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+
+    def put(self, text: str, key: str = None) -> str:
+        """
+        Stores a body and returns its key. A key computed beforehand with blob_key, e.g. in another process, is taken
+        as is.
+        """
+        key = key or blob_key(text)
+        # the first copy is kept, later equal bodies are dropped with their request entry; a body that is on disk
+        # already is dropped from memory again when it is saved
+        self.blobs.setdefault(key, text)
+        return key
+
+    def get(self, key: str) -> str:
+        text = self.blobs.get(key)
+        if text is not None:
+            return text
+        with self.lock:
+            text = self.cache.get(key)
+            if text is not None:
+                self.cache.move_to_end(key)
+                return text
+        path = self.find(key)
+        if path is None:
+            raise KeyError(key)
+        with open(path, 'rb') as f:
+            text = zlib.decompress(f.read()).decode('utf-8', 'surrogatepass')
+        if metrics.enabled:
+            metrics.count('blob_reads')
+        with self.lock:
+            self.cache[key] = text
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return text
+
+    def find(self, key: str) -> str | None:
+        """
+        Returns the path of the body of a key in the attached directories, or None.
+        """
+        for directory in self.directories:
+            path = blob_path(directory, key)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def save(self, keys: Iterable[str], directory: str) -> int:
+        """
+        Returns the number of bodies written.
+        """
+        keys = set(keys)
+        written = 0
+        for key in keys:
+            path = blob_path(directory, key)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(zlib.compress(self.get(key).encode('utf-8', 'surrogatepass')))
+                os.replace(path + '.tmp', path)
+                written += 1
+        if directory not in self.directories:
+            self.directories.append(directory)
+        self.release(keys)
+        return written
+
+    def attach(self, keys: Iterable[str], directory: str):
+        """
+        Raises FileNotFoundError if a body is neither in memory nor in directory.
+        """
+        for key in keys:
+            if key not in self.blobs and not os.path.exists(blob_path(directory, key)):
+                raise FileNotFoundError(blob_path(directory, key))
+        if directory not in self.directories:
+            self.directories.append(directory)
+
+    def release(self, keys: Iterable[str]):
+        for key in keys:
+            self.blobs.pop(key, None)
+
+
+blob_store = BlobStore()
@@ -0,0 +1,67 @@
+from typing import Dict
+
+from bs4 import BeautifulSoup
+
+from src.entity.Request import Request
+from src.shared.metrics import metrics
+
+DEFAULT_PARSER = 'html.parser'
+
+
+def is_parser_available(parser: str) -> bool:
+    """
+    Checks whether the given BeautifulSoup parser backend can be used.
+
+    Parameters:
+    - parser (str): The parser name, e.g. 'html.parser' or 'lxml'.
+
+    Returns:
+    - bool: True if the backend is installed, False otherwise.
+    """
+    if parser == 'html.parser':
+        return True
+    try:
+        BeautifulSoup('', parser)
+        return True
+    except Exception:
+        return False
+
+
+class DocumentCache:
+    """
+    Cache of parsed HTML documents, keyed by request.
+
+    Every comparator that needs the DOM of a request asks the cache instead of parsing the body itself, so each body
+    is parsed at most once per comparison. The documents of a request should be released as soon as all comparators
+    are done with it to keep memory bounded.
+
+    Attributes:
+        parser (str): The BeautifulSoup parser backend, 'html.parser' by default. 'lxml' is considerably faster when
+            installed.
+
+    Methods:
+        get(request): Returns the parsed document of the request, parsing it on first access.
+        release(request): Drops the parsed document of the request.
+    """
+    documents: Dict[int, BeautifulSoup]
+
+    def __init__(self, parser: str = DEFAULT_PARSER):
+        if not is_parser_available(parser):
+            print(f'HTML parser {parser} is not installed, falling back to {DEFAULT_PARSER}')
+            parser = DEFAULT_PARSER
+        self.parser = parser
+        self.documents = {}
+
+    def get(self, request: Request) -> BeautifulSoup:
+        document = self.documents.get(request.id)
+        if document is None:
+            document = BeautifulSoup(request.content, self.parser)
+            if metrics.enabled:
+                metrics.count('html_bytes_parsed', len(request.content.encode('utf-8', 'surrogatepass')))
+            self.documents[request.id] = document
+        return document
+
+    def release(self, request: Request):
+        document = self.documents.pop(request.id, None)
+        if document is not None:
+            document.decompose()
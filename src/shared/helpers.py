@@ -2,33 +2,19 @@ import cgi
 import email
 import io
 from email import message_from_bytes
-from typing import List
-from src.entity.Request import Request
 from src.entity.Change import Change
+from src.shared.metrics import debug
+from src.shared.route_templates import route_normalizer
 import html
 from urllib.parse import parse_qs
-from bs4 import BeautifulSoup
 import json
 import re
+import hashlib
 
-
-
-def find_by_identifier(requests: List[Request], identifier: str) -> Request | None:
-    """
-    Searches for a request in the given list of requests based on the provided identifier.
-
-    Args:
-        requests (List[Request]): The list of requests to search in.
-        identifier (str): The identifier to be used for searching.
-
-    Returns:
-        Request | None: The found Request object if a matching identifier is found, or None if no match is found.
-
-    """
-    for request in requests:
-        if request.identifier == identifier:
-            return request
-    return None
+HTML_START_TAG = re.compile(r'<[a-zA-Z][^\t\n\r\f />\x00]*(?:[\s/][^>]*)?>')
+JSON_WHITESPACE = ' \t\n\r'
+# first characters of the documents json.loads accepts, including NaN and Infinity
+JSON_START = set('{["-0123456789tfnNI')
 
 
 def get_unique_identifier(entry, base_url: str):
@@ -40,12 +26,13 @@ def get_unique_identifier(entry, base_url: str):
     - base_url: A string representing the base URL for the entry.
 
     Returns:
-    - A unique identifier for the entry, using the entry's request method and URL.
+    - A unique identifier for the entry, using the entry's request method and URL. The path is mapped to its route
+      template, see RouteNormalizer.
 
     """
     url = entry['request']['url'].replace(base_url, '')
 
-    url_base = url.split('?')[0]
+    url_base = route_normalizer.normalize(url.split('?')[0])
 
     if len(url.split('?')) > 1:
         url_params = url.split('?')[1]
@@ -58,6 +45,8 @@ def get_unique_identifier(entry, base_url: str):
                 param_names.append(key)
 
         url = url_base + '?' + '&'.join(param_names)
+    else:
+        url = url_base
 
     return entry['request']['method'] + html.escape(url)
 
@@ -91,13 +80,17 @@ def is_relevant(entry, base_url: str):
     - True if the entry is relevant, False otherwise
 
     """
-    if base_url not in entry['request']['url']:
+    return is_relevant_response(entry['request']['url'], base_url,
+                                find_header_value(entry['response']['headers'], 'Content-Type'))
+
+
+def is_relevant_response(url: str, base_url: str, content_type_value: str | None) -> bool:
+    if base_url not in url:
         return False
 
-    if 'favicon.ico' in entry['request']['url']:
+    if 'favicon.ico' in url:
         return False
 
-    content_type_value = find_header_value(entry['response']['headers'], 'Content-Type')
     if not content_type_value:
         return False
 
@@ -109,6 +102,86 @@ def is_relevant(entry, base_url: str):
 
     return False
 
+
+def header_map(header_list) -> dict:
+    """
+    Returns the headers of a HAR request or response as dictionary with lower case names. Like find_header_value,
+    the first header of a name wins.
+    """
+    headers = {}
+    for header_entry in header_list:
+        headers.setdefault(header_entry['name'].lower(), header_entry['value'])
+    return headers
+
+
+class EntryClassification:
+    """
+    Result of classify_entry.
+
+    Attributes:
+        relevant (bool): The entry belongs to the application and is HTML or JSON.
+        is_async (bool): The response body is JSON or declared as JSON.
+        is_static (bool): The response is an HTML page that was not requested by a script.
+        content_json: The decoded JSON response body, or None if the body is no JSON.
+    """
+    __slots__ = ('relevant', 'is_async', 'is_static', 'content_json')
+
+    def __init__(self):
+        self.relevant = False
+        self.is_async = False
+        self.is_static = False
+        self.content_json = None
+
+
+def classify_entry(entry, base_url: str) -> EntryClassification:
+    """
+    Decides relevance and kind of a HAR entry in one pass.
+
+    The response headers are looked up in one dictionary, the body is only decoded as JSON if its first character
+    can start a JSON document, and only searched for an HTML tag if the response is declared as HTML. An entry can be
+    both async and static, e.g. a JSON string that contains markup served as text/html.
+
+    Parameters:
+    - entry: The HAR entry.
+    - base_url: The base URL of the crawled application.
+
+    Returns:
+    - EntryClassification: Relevance, kind and the decoded JSON body, to be reused for the schemas.
+    """
+    classification = EntryClassification()
+    content_type_value = header_map(entry['response']['headers']).get('content-type')
+    if not is_relevant_response(entry['request']['url'], base_url, content_type_value):
+        return classification
+    classification.relevant = True
+
+    content = entry['response']['content']
+    is_json = False
+    if 'text' in content:
+        is_json, classification.content_json = decode_json(content['text'])
+    classification.is_async = is_json or 'application/json' in content_type_value
+
+    if 'text/html' in content_type_value and ('text' not in content or contains_html_tag(content['text'])):
+        classification.is_static = find_header_value(entry['request']['headers'],
+                                                     'X-Requested-With') != 'XMLHttpRequest'
+    return classification
+
+
+def decode_json(text: str) -> (bool, object):
+    """
+    Returns whether text is a JSON document, and the decoded document. Text whose first character cannot start a
+    JSON document is rejected without running the decoder.
+    """
+    stripped = text.lstrip(JSON_WHITESPACE)
+    if not stripped or stripped[0] not in JSON_START:
+        debug('no json')
+        return False, None
+    try:
+        return True, json.loads(text)
+    except ValueError:
+        debug('no json')
+        return False, None
+
+
 def parse_multipart_formdata(data, boundary):
     """
 
@@ -148,59 +221,20 @@ def parse_multipart_formdata(data, boundary):
     return parsed_data
 
 
-def is_static(entry):
+def contains_html_tag(text: str) -> bool:
     """
-    Check if a given entry is a static resource.
-
-    :param entry: The entry to be checked.
-    :type entry: dict
-    :return: True if the entry is a static resource, False otherwise.
-    :rtype: bool
-    """
-    requested_with = find_header_value(entry['request']['headers'], 'X-Requested-With')
-    if requested_with:
-        print(requested_with)
-    if requested_with and requested_with == 'XMLHttpRequest':
-        return False
-
-    if 'text' in entry['response']['content'] and not bool(BeautifulSoup(entry['response']['content']['text'], "html.parser").find()):
-        return False
+    Check if the given text contains at least one HTML start tag.
 
-    content_type_value = find_header_value(entry['response']['headers'], 'Content-Type')
-    if not content_type_value:
-        return False
-
-    if 'text/html' in content_type_value:
-        return True
-
-    return False
+    This mirrors what html.parser accepts as a start tag, so the body does not have to be parsed into a DOM just to
+    find out whether it is HTML.
 
-def is_async(entry):
-    """
-    Check if a given entry is asynchronous.
-
-    :param entry: The entry to be checked.
-    :type entry: dict
-    :return: True if the entry is asynchronous, False otherwise.
+    :param text: The text to be checked.
+    :type text: str
+    :return: True if a start tag was found, False otherwise.
     :rtype: bool
     """
-    if 'text' in entry['response']['content']:
-        content = entry['response']['content']['text']
-
-        try:
-            json.loads(content)
-            return True
-        except ValueError as e:
-            print('no json')
+    return HTML_START_TAG.search(text) is not None
 
-    content_type_value = find_header_value(entry['response']['headers'], 'Content-Type')
-    if not content_type_value:
-        return False
-
-    if 'application/json' in content_type_value:
-        return True
-
-    return False
 
 def sequence_matcher_to_txt(diff):
     """
@@ -263,3 +297,27 @@ def remove_numbers_in_string(value):
     pattern = r'[0-9]'
     cleaned = re.sub(pattern, '', value)
     return cleaned
+
+
+
+def content_fingerprint(content: str) -> str:
+    """
+    Hash a response body after normalizing line endings and trailing whitespace, which neither the structure nor the
+    rendering of a page depends on.
+
+    Parameters:
+        content (str): The response body.
+
+    Returns:
+        str: The hex digest of the normalized body.
+    """
+    normalized = '\n'.join(line.rstrip() for line in content.strip().splitlines())
+    return hashlib.sha256(normalized.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def combine_schema_hashes(*hashes: str) -> str:
+    """
+    Combines the schema_hash values of several JSON schemas, e.g. parameter and response schema of a request, into
+    one fingerprint.
+    """
+    return hashlib.sha256(''.join(hashes).encode('utf-8')).hexdigest()
@@ -0,0 +1,126 @@
+import contextlib
+import json
+import time
+
+verbose = False
+
+
+def set_verbose(value: bool):
+    global verbose
+    verbose = value
+
+
+def is_verbose() -> bool:
+    return verbose
+
+
+def debug(*values):
+    """
+    Prints progress and debug output of the hot loops, but only in verbose mode.
+    """
+    if verbose:
+        print(*values)
+
+
+class Metrics:
+    """
+    Collects wall and CPU time and counters of a run.
+
+    Timings are grouped by kind, e.g. 'stage', 'comparator' or 'identifier', and by name within a kind. Every timing
+    records the number of calls and the summed wall and CPU seconds. CPU time is the time of the whole process, so it
+    includes the threads running in the background.
+
+    Attributes:
+        enabled (bool): Flag indicating whether anything is recorded. A disabled collector costs almost nothing.
+        timings (dict): The timings as {kind: {name: [calls, wall seconds, cpu seconds]}}.
+        counters (dict): The counters as {name: value}, e.g. 'html_bytes_parsed' or 'renders'.
+
+    Methods:
+        measure(kind, name): Context manager that adds the time of its block to the timing ``name`` of ``kind``.
+        count(name, amount): Adds ``amount`` to a counter.
+        add(exported): Adds the timings and counters of another collector, e.g. of a worker process.
+        export(): Returns the timings and counters as JSON serializable dict.
+        slowest(kind, top): Returns the ``top`` names of a kind with the highest wall time.
+        reset(enabled): Drops everything recorded so far and enables or disables the collector.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.timings = {}
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def measure(self, kind: str, name: str):
+        if not self.enabled:
+            yield
+            return
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            timing = self.timings.setdefault(kind, {}).setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += time.perf_counter() - wall
+            timing[2] += time.process_time() - cpu
+
+    def count(self, name: str, amount: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add(self, exported: dict):
+        for kind, timings in exported['timings'].items():
+            for name, exported_timing in timings.items():
+                timing = self.timings.setdefault(kind, {}).setdefault(name, [0, 0.0, 0.0])
+                timing[0] += exported_timing['calls']
+                timing[1] += exported_timing['wall_seconds']
+                timing[2] += exported_timing['cpu_seconds']
+        for name, value in exported['counters'].items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def export(self) -> dict:
+        timings = {kind: {name: {'calls': calls, 'wall_seconds': round(wall, 6), 'cpu_seconds': round(cpu, 6)}
+                          for name, (calls, wall, cpu) in kind_timings.items()}
+                   for kind, kind_timings in self.timings.items()}
+        return {'timings': timings, 'counters': dict(self.counters)}
+
+    def slowest(self, kind: str, top: int = 10) -> list:
+        timings = self.timings.get(kind, {})
+        return sorted(timings.items(), key=lambda item: item[1][1], reverse=True)[:top]
+
+    def reset(self, enabled: bool):
+        self.enabled = enabled
+        self.timings = {}
+        self.counters = {}
+
+
+metrics = Metrics()
+
+
+def write_metrics(filename: str, top: int = 10) -> str:
+    """
+    Writes the collected metrics as JSON file and returns a summary of the stages, the comparators and the slowest
+    pages.
+
+    Parameters:
+    - filename (str): The JSON file to write.
+    - top (int): Number of pages listed in the summary and in the 'slowest_identifiers' of the file.
+
+    Returns:
+    - str: The summary.
+    """
+    exported = metrics.export()
+    exported['slowest_identifiers'] = [name for name, _ in metrics.slowest('identifier', top)]
+    with open(filename, 'w') as f:
+        json.dump(exported, f, indent=2)
+
+    summary = ''
+    for kind, title in [('stage', 'Stages'), ('comparator', 'Comparators'),
+                        ('identifier', f'Slowest {top} pages')]:
+        summary += f'========= {title} =========\n'
+        for name, (calls, wall, cpu) in metrics.slowest(kind, top if kind == 'identifier' else None):
+            summary += f'{wall:>10.3f}s wall {cpu:>10.3f}s cpu {calls:>7}x  {name}\n'
+    for name, value in metrics.counters.items():
+        summary += f'{name}: {value}\n'
+    summary += f'Metrics: {filename}\n'
+    return summary
@@ -0,0 +1,123 @@
+import re
+from typing import Dict, Iterable, List
+
+# patterns of variable path segments, in the order in which they are tried
+SEGMENT_PATTERNS = {
+    'uuid': r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}',
+    'date': r'\d{4}-\d{2}-\d{2}',
+    # hex digests and object ids, at least 8 characters with both digits and letters
+    'hash': r'(?=[0-9a-fA-F]*\d)(?=[0-9a-fA-F]*[a-fA-F])[0-9a-fA-F]{8,}',
+    'int': r'\d+',
+    'slug': r'[a-z0-9]+(?:-[a-z0-9]+){2,}',
+}
+TEMPLATE_PARAMETER = re.compile(r'\{[^/{}]*\}')
+LEARNED_PARAMETER = '{param}'
+
+
+def template_to_regex(template: str) -> str:
+    """
+    Returns the regular expression of a route template such as '/product/{id}/reviews', where every {name} stands
+    for exactly one path segment.
+    """
+    parts = TEMPLATE_PARAMETER.split(template)
+    return '[^/]+'.join(re.escape(part) for part in parts)
+
+
+class RouteNormalizer:
+    """
+    Maps the path of a URL to its route template, so that e.g. /product/123 and /product/124 become the single
+    request /product/{int} and are compared once.
+
+    Templates given explicitly take precedence and replace the whole path. Otherwise every path segment that matches
+    one of the enabled segment patterns is replaced by the name of the pattern. Both are compiled into one regular
+    expression each, so normalizing a path costs a single match and a single substitution.
+
+    Attributes:
+        patterns (List[str]): The enabled names of SEGMENT_PATTERNS.
+        templates (List[str]): The route templates, e.g. ['/product/{id}', '/blog/{slug}/comments'].
+        signature (list): Identifies the configuration, stored with compiled snapshots.
+
+    Methods:
+        configure(patterns, templates): Replaces the configuration.
+        normalize(path): Returns the template of a path, or the path itself.
+    """
+    patterns: List[str]
+    templates: List[str]
+
+    def __init__(self, patterns: Iterable[str] = (), templates: Iterable[str] = ()):
+        self.configure(patterns, templates)
+
+    def configure(self, patterns: Iterable[str] = (), templates: Iterable[str] = ()):
+        unknown = set(patterns) - set(SEGMENT_PATTERNS)
+        if unknown:
+            raise ValueError(f"Unknown route patterns {', '.join(sorted(unknown))}. Use {', '.join(SEGMENT_PATTERNS)}")
+        self.patterns = [pattern for pattern in SEGMENT_PATTERNS if pattern in set(patterns)]
+        self.templates = list(templates)
+        self.signature = [self.patterns, self.templates]
+        self.template_matcher = None
+        if self.templates:
+            self.template_matcher = re.compile('|'.join(f'(?P<t{index}>{template_to_regex(template)})'
+                                                        for index, template in enumerate(self.templates)))
+        self.segment_matcher = None
+        if self.patterns:
+            # a segment starts at the beginning of the path or after a slash
+            alternatives = '|'.join(f'(?P<{pattern}>{SEGMENT_PATTERNS[pattern]})' for pattern in self.patterns)
+            self.segment_matcher = re.compile(f'(?<![^/])(?:{alternatives})(?=/|$)')
+
+    def normalize(self, path: str) -> str:
+        if self.template_matcher:
+            match = self.template_matcher.fullmatch(path)
+            if match:
+                return self.templates[int(match.lastgroup[1:])]
+        if self.segment_matcher:
+            return self.segment_matcher.sub(lambda match: '{' + match.lastgroup + '}', path)
+        return path
+
+
+route_normalizer = RouteNormalizer()
+
+
+def learn_route_templates(paths: Iterable[str], min_values: int = 20) -> List[str]:
+    """
+    Learns route templates from the paths of a capture. A path position under a common prefix that takes at least
+    min_values different values is a parameter; the paths below its values are merged.
+
+    Parameters:
+    - paths (Iterable[str]): The paths of the captured requests, without query string.
+    - min_values (int): Number of different segments at one position from which on it is a parameter.
+
+    Returns:
+    - List[str]: The templates with at least one parameter, e.g. ['/product/{param}', '/product/{param}/reviews'].
+    """
+    tree = {}
+    for path in paths:
+        node = tree
+        for segment in path.split('/'):
+            node = node.setdefault(segment, {})
+        # None marks the end of a path
+        node[None] = {}
+
+    templates = []
+
+    def walk(node: Dict, prefix: str | None):
+        segments = [segment for segment in node if segment is not None]
+        if len(segments) >= min_values:
+            merged = {}
+            for segment in segments:
+                merge_trees(merged, node[segment])
+            node = {LEARNED_PARAMETER: merged, None: node[None]} if None in node else {LEARNED_PARAMETER: merged}
+        for segment, child in node.items():
+            if segment is None:
+                continue
+            path = segment if prefix is None else prefix + '/' + segment
+            if None in child and LEARNED_PARAMETER in path:
+                templates.append(path)
+            walk(child, path)
+
+    walk(tree, None)
+    return templates
+
+
+def merge_trees(target: Dict, source: Dict):
+    for segment, child in source.items():
+        merge_trees(target.setdefault(segment, {}), child)
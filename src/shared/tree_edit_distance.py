@@ -0,0 +1,205 @@
+from collections import Counter
+from typing import List, Tuple
+
+DELETE = 'delete'
+INSERT = 'insert'
+RENAME = 'rename'
+
+
+class IndexedTree:
+    """
+    Postorder representation of a tree for the Zhang-Shasha algorithm.
+
+    Subtrees whose hash also occurs in the other tree are collapsed into a single leaf weighted with the subtree size.
+    Matching two identical collapsed subtrees costs nothing, so they are skipped instead of being compared node by
+    node. Every other operation on a collapsed subtree costs as much as on its root plus deleting or inserting the
+    rest of it, so the result is an upper bound of the exact distance, and exact whenever identical subtrees are
+    mapped onto each other.
+
+    Attributes:
+        nodes (list): The original nodes in postorder, index 0 is unused.
+        tags (list): Tag of the node.
+        hashes (list): Subtree hash of the node.
+        weights (list): Cost of inserting or deleting the node, i.e. 1 or the size of the collapsed subtree.
+        collapsed (list): Flag indicating whether the node stands for a whole subtree.
+        leftmost (list): Postorder index of the leftmost leaf of the subtree of each node.
+        keyroots (list): The keyroots in ascending order.
+    """
+
+    def __init__(self, root, common_hashes: set):
+        self.nodes = [None]
+        self.tags = [None]
+        self.hashes = [None]
+        self.weights = [0]
+        self.collapsed = [False]
+        self.leftmost = [0]
+
+        stack = [(root, False)]
+        first_leaf = []
+        while stack:
+            node, expanded = stack.pop()
+            is_collapsed = node.hash in common_hashes
+            if not expanded and not is_collapsed and node.children:
+                stack.append((node, True))
+                for child in reversed(node.children):
+                    stack.append((child, False))
+                first_leaf.append(len(self.nodes))
+                continue
+            index = len(self.nodes)
+            self.nodes.append(node)
+            self.tags.append(node.tag)
+            self.hashes.append(node.hash)
+            self.weights.append(node.size if is_collapsed else 1)
+            self.collapsed.append(is_collapsed)
+            self.leftmost.append(first_leaf.pop() if expanded else index)
+
+        self.size = len(self.nodes) - 1
+        last_with_leftmost = {}
+        for index in range(1, self.size + 1):
+            last_with_leftmost[self.leftmost[index]] = index
+        self.keyroots = sorted(last_with_leftmost.values())
+
+
+def subtree_hashes(root) -> Counter:
+    """
+    Computes hash and size of every subtree iteratively and stores them on the nodes.
+
+    Returns:
+        Counter: How often each subtree hash occurs.
+    """
+    hashes = Counter()
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if not expanded:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children)
+            continue
+        node.hash = hash((node.tag, tuple(child.hash for child in node.children)))
+        node.size = 1 + sum(child.size for child in node.children)
+        hashes[node.hash] += 1
+    return hashes
+
+
+class ZhangShasha:
+    """
+    Ordered tree edit distance after Zhang and Shasha, computed iteratively.
+
+    Insert and delete cost the node weight. Renaming costs 1 for differing tags plus the weight of the descendants of
+    collapsed subtrees, except for two identical collapsed subtrees, which match for free.
+    """
+
+    def __init__(self, tree1: IndexedTree, tree2: IndexedTree):
+        self.tree1 = tree1
+        self.tree2 = tree2
+        self.treedist = [[0] * (tree2.size + 1) for _ in range(tree1.size + 1)]
+
+    def rename_cost(self, i: int, j: int) -> int:
+        t1, t2 = self.tree1, self.tree2
+        if t1.collapsed[i] and t2.collapsed[j] and t1.hashes[i] == t2.hashes[j]:
+            return 0
+        return (t1.tags[i] != t2.tags[j]) + t1.weights[i] - 1 + t2.weights[j] - 1
+
+    def distance(self) -> int:
+        for i in self.tree1.keyroots:
+            for j in self.tree2.keyroots:
+                self.forest_distance(i, j)
+        return self.treedist[self.tree1.size][self.tree2.size]
+
+    def forest_distance(self, i: int, j: int) -> List[List[int]]:
+        t1, t2 = self.tree1, self.tree2
+        treedist = self.treedist
+        l1, l2 = t1.leftmost, t2.leftmost
+        w1, w2 = t1.weights, t2.weights
+        li, lj = l1[i], l2[j]
+        rows, cols = i - li + 2, j - lj + 2
+
+        forestdist = [[0] * cols for _ in range(rows)]
+        for x in range(1, rows):
+            forestdist[x][0] = forestdist[x - 1][0] + w1[li + x - 1]
+        for y in range(1, cols):
+            forestdist[0][y] = forestdist[0][y - 1] + w2[lj + y - 1]
+
+        for x in range(1, rows):
+            node1 = li + x - 1
+            row, previous_row = forestdist[x], forestdist[x - 1]
+            delete = w1[node1]
+            on_left_path1 = l1[node1] == li
+            for y in range(1, cols):
+                node2 = lj + y - 1
+                cost = min(previous_row[y] + delete, row[y - 1] + w2[node2])
+                if on_left_path1 and l2[node2] == lj:
+                    cost = min(cost, previous_row[y - 1] + self.rename_cost(node1, node2))
+                    treedist[node1][node2] = cost
+                else:
+                    cost = min(cost, forestdist[l1[node1] - li][l2[node2] - lj] + treedist[node1][node2])
+                row[y] = cost
+        return forestdist
+
+    def edit_script(self) -> List[Tuple[str, object, object]]:
+        """
+        Backtracks the operations of the computed distance. Must be called after distance().
+
+        Returns:
+            list: Tuples (operation, node of tree 1, node of tree 2), with None for the missing side.
+        """
+        t1, t2 = self.tree1, self.tree2
+        l1, l2 = t1.leftmost, t2.leftmost
+        script = []
+        stack = [(t1.size, t2.size)]
+        while stack:
+            i, j = stack.pop()
+            forestdist = self.forest_distance(i, j)
+            li, lj = l1[i], l2[j]
+            x, y = i - li + 1, j - lj + 1
+            while x > 0 or y > 0:
+                node1, node2 = li + x - 1, lj + y - 1
+                if x > 0 and forestdist[x][y] == forestdist[x - 1][y] + t1.weights[node1]:
+                    script.append((DELETE, t1.nodes[node1], None))
+                    x -= 1
+                elif y > 0 and forestdist[x][y] == forestdist[x][y - 1] + t2.weights[node2]:
+                    script.append((INSERT, None, t2.nodes[node2]))
+                    y -= 1
+                elif l1[node1] == li and l2[node2] == lj:
+                    if self.rename_cost(node1, node2):
+                        script.append((RENAME, t1.nodes[node1], t2.nodes[node2]))
+                    x -= 1
+                    y -= 1
+                else:
+                    stack.append((node1, node2))
+                    x, y = l1[node1] - li, l2[node2] - lj
+        return script
+
+
+def tree_edit_distance(root1, root2, node_budget: int) -> Tuple[int, List[Tuple[str, object, object]]] | None:
+    """
+    Computes the ordered tree edit distance between two trees of nodes with ``tag`` and ``children``.
+
+    Subtrees that occur once in each tree are collapsed, see IndexedTree. The result is therefore an upper bound of
+    the exact distance: it is exact when the optimal mapping pairs every collapsed subtree with its identical copy,
+    and otherwise can be a few operations higher. A collapsed subtree that is mapped onto a different subtree is
+    reported as a RENAME of the two roots even if their tags are equal.
+
+    Parameters:
+        root1: The root of the first tree.
+        root2: The root of the second tree.
+        node_budget (int): Maximum number of nodes per tree after collapsing identical subtrees.
+
+    Returns:
+        tuple | None: The distance and the edit script, or None if a tree exceeds the node budget.
+    """
+    hashes1 = subtree_hashes(root1)
+    hashes2 = subtree_hashes(root2)
+    if root1.hash == root2.hash:
+        return 0, []
+
+    # only subtrees occurring exactly once on each side are collapsed, repeated ones could be matched differently
+    common_hashes = {h for h, count in hashes1.items() if count == 1 and hashes2.get(h) == 1}
+    tree1 = IndexedTree(root1, common_hashes)
+    tree2 = IndexedTree(root2, common_hashes)
+    if tree1.size > node_budget or tree2.size > node_budget:
+        return None
+
+    algorithm = ZhangShasha(tree1, tree2)
+    distance = algorithm.distance()
+    return distance, algorithm.edit_script()
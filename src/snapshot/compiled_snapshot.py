@@ -0,0 +1,160 @@
+import os
+import pickle
+
+from src.entity.Request import Request, StaticRequest, AsyncRequest
+from src.entity.Snapshot import Snapshot
+from src.shared.blob_store import blob_store, BLOB_DIRECTORY
+from src.shared.route_templates import route_normalizer
+from src.snapshot.har_reader import capture_path
+
+FORMAT_VERSION = 4
+ROOT_IDENTIFIER = 'Root'
+
+# attributes rebuilt on load instead of being stored with the request
+RELATION_ATTRIBUTES = {'id', 'changes', 'previous_requests', 'previous_requests_by_identifier', 'async_requests',
+                       'async_requests_by_identifier'}
+
+
+def compiled_snapshot_path(name: str, snapshot_directory: str) -> str:
+    return os.path.join(snapshot_directory, name + '.snapshot')
+
+
+def blob_directory(snapshot_directory: str) -> str:
+    return os.path.join(snapshot_directory, BLOB_DIRECTORY)
+
+
+def has_capture(name: str, snapshot_directory: str) -> bool:
+    return os.path.exists(capture_path(name, snapshot_directory))
+
+
+def content_keys(snapshot: Snapshot) -> list:
+    return [request.content_key for static_request in snapshot.static_requests
+            for request in [static_request] + static_request.async_requests if request.content_key]
+
+
+def source_stamp(name: str, snapshot_directory: str) -> list:
+    """
+    Returns path, modification time and size of the capture and domain file, which together identify the parsed input.
+    """
+    stamp = []
+    for path in [capture_path(name, snapshot_directory), os.path.join(snapshot_directory, name + '.domain.txt')]:
+        stat = os.stat(path)
+        stamp.append((os.path.basename(path), stat.st_mtime_ns, stat.st_size))
+    return stamp
+
+
+def request_attributes(request: Request) -> list:
+    return [key for cls in type(request).__mro__ for key in getattr(cls, '__slots__', ())
+            if key not in RELATION_ATTRIBUTES]
+
+
+def request_to_dict(request: Request) -> dict:
+    return {key: getattr(request, key) for key in request_attributes(request)}
+
+
+def request_from_dict(request: Request, data: dict) -> Request:
+    for key, value in data.items():
+        setattr(request, key, value)
+    return request
+
+
+def save_compiled_snapshot(snapshot: Snapshot, name: str, snapshot_directory: str):
+    """
+    Stores the classified requests of a snapshot next to its HAR file.
+
+    The requests are stored as a flat list with the navigation edges as identifiers, so that neither saving nor
+    loading has to walk the previous_requests graph recursively. The response bodies are not part of the file, they
+    are added to the blob store of the snapshot directory, which keeps bodies shared by several snapshots once.
+
+    Parameters:
+    - snapshot (Snapshot): The parsed snapshot.
+    - name (str): The name of the snapshot (without the extension).
+    - snapshot_directory (str): The directory where the HAR file is located.
+    """
+    data = {
+        'version': FORMAT_VERSION,
+        'source': source_stamp(name, snapshot_directory),
+        'routes': route_normalizer.signature,
+        'base_url': snapshot.base_url,
+        'static_requests': [{
+            'request': request_to_dict(static_request),
+            'previous_requests': [r.identifier for r in static_request.previous_requests],
+            'async_requests': [request_to_dict(r) for r in static_request.async_requests],
+        } for static_request in snapshot.static_requests],
+    }
+    blob_store.save(content_keys(snapshot), blob_directory(snapshot_directory))
+    path = compiled_snapshot_path(name, snapshot_directory)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def load_compiled_snapshot(name: str, snapshot_directory: str) -> Snapshot | None:
+    """
+    Loads the compiled snapshot of the given name. It is outdated if its capture changed or it was compiled with
+    other route templates. Without a capture file, e.g. after pack_snapshot, the compiled snapshot is the only copy
+    and is loaded without checking its source.
+
+    Parameters:
+    - name (str): The name of the snapshot (without the extension).
+    - snapshot_directory (str): The directory where the HAR file is located.
+
+    Returns:
+    - Snapshot | None: The snapshot, or None if there is no compiled snapshot, it is outdated or its bodies are
+      missing from the blob store.
+    """
+    path = compiled_snapshot_path(name, snapshot_directory)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if data.get('version') != FORMAT_VERSION:
+        return None
+    if has_capture(name, snapshot_directory) and (data.get('source') != source_stamp(name, snapshot_directory) or
+                                                  data.get('routes') != route_normalizer.signature):
+        return None
+
+    snapshot = Snapshot(base_url=data['base_url'])
+    root = StaticRequest()
+    root.identifier = ROOT_IDENTIFIER
+    for static_data in data['static_requests']:
+        static_request = request_from_dict(StaticRequest(), static_data['request'])
+        for async_data in static_data['async_requests']:
+            static_request.add_async_request(request_from_dict(AsyncRequest(), async_data))
+        snapshot.add_static_request(static_request)
+
+    for static_request, static_data in zip(snapshot.static_requests, data['static_requests']):
+        for identifier in static_data['previous_requests']:
+            previous_request = root if identifier == ROOT_IDENTIFIER else snapshot.find_static_request(identifier)
+            static_request.add_previous_request(previous_request)
+
+    try:
+        blob_store.attach(content_keys(snapshot), blob_directory(snapshot_directory))
+    except FileNotFoundError:
+        return None
+    return snapshot
+
+
+def pack_snapshot(name: str, snapshot_directory: str) -> int:
+    """
+    Removes the capture file of a snapshot whose compiled snapshot is up to date. Its bodies stay in the blob store,
+    so only the bodies that no other snapshot shares take space.
+
+    Parameters:
+    - name (str): The name of the snapshot (without the extension).
+    - snapshot_directory (str): The directory where the HAR file is located.
+
+    Returns:
+    - int: The number of bytes freed.
+    """
+    if load_compiled_snapshot(name, snapshot_directory) is None:
+        raise ValueError(f'{name} has no up to date compiled snapshot')
+    path = capture_path(name, snapshot_directory)
+    if not os.path.exists(path):
+        return 0
+    size = os.path.getsize(path)
+    os.remove(path)
+    return size
@@ -0,0 +1,211 @@
+import json
+import os
+import re
+from typing import Iterator, List, TextIO
+
+_WHITESPACE = ' \t\n\r'
+# characters that may continue a number that raw_decode stopped early, e.g. the '.5' of '1.5' cut after '1.'
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+# capture formats in the order in which they are looked up, see capture_path
+CAPTURE_EXTENSIONS = ['.jsonl', '.har']
+_decoder = json.JSONDecoder()
+
+
+class _JsonStream:
+    """
+    Minimal incremental reader over a JSON text file.
+
+    Only the parts of the document that are needed to reach ``log.entries`` are tokenized by hand, every value is
+    decoded with ``json.JSONDecoder.raw_decode`` on a sliding buffer. When a value does not fit into the buffer, the
+    read size is doubled, so the buffer only ever grows to roughly the size of the largest single value.
+    """
+
+    def __init__(self, file: TextIO, chunk_size: int):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size: int) -> bool:
+        if self.eof:
+            return False
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        data = self.file.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer += data
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill(self.chunk_size):
+                raise ValueError('Unexpected end of HAR file')
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f'Invalid HAR file: expected {char!r} at offset {self.pos}')
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        read_size = self.chunk_size
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # a value followed by nothing but number characters up to the buffer end may be a truncated number
+                if self.eof or not _NUMBER_TAIL.fullmatch(self.buffer, end):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill(read_size)
+            read_size *= 2
+
+
+def iter_har_entries(file: TextIO, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """
+    Yields the entries of ``log.entries`` of a HAR file one by one without loading the whole document.
+
+    Parameters:
+    - file (TextIO): The opened HAR file.
+    - chunk_size (int): Number of characters read from the file at once (default 1 MiB).
+
+    Returns:
+    - Iterator[dict]: The HAR entries in file order.
+
+    Example Usage:
+        with open('example.har', 'r') as f:
+            for entry in iter_har_entries(f):
+                print(entry['request']['url'])
+    """
+    stream = _JsonStream(file, chunk_size)
+    stream.expect('{')
+    for key in _iter_object_keys(stream):
+        if key != 'log':
+            stream.value()
+            continue
+        stream.expect('{')
+        for log_key in _iter_object_keys(stream):
+            if log_key != 'entries':
+                stream.value()
+                continue
+            stream.expect('[')
+            if stream.peek() == ']':
+                return
+            while True:
+                yield stream.value()
+                if stream.peek() == ']':
+                    return
+                stream.expect(',')
+        return
+
+
+def iter_jsonl_entries(file: TextIO) -> Iterator[dict]:
+    """
+    Yields the entries of a JSON lines capture written by the capture addon, one HAR entry per line.
+
+    A last line without line break is what a killed proxy leaves behind while writing; it is skipped if it cannot be
+    decoded.
+
+    Parameters:
+    - file (TextIO): The opened JSON lines file.
+
+    Returns:
+    - Iterator[dict]: The HAR entries in capture order.
+    """
+    for line in file:
+        entry = decode_jsonl_line(line)
+        if entry is not None:
+            yield entry
+
+
+def decode_jsonl_line(line: str) -> dict | None:
+    """
+    Decodes one line of a JSON lines capture. Returns None for a blank line and for a truncated last line, i.e. one
+    without line break that cannot be decoded.
+    """
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        if line.endswith('\n'):
+            raise
+        return None
+
+
+def merge_captures(shard_files: List[str], target: str) -> int:
+    """
+    Writes the JSON lines captures of a sharded crawl into one capture. Every entry is tagged with the number of its
+    shard in the HAR custom field '_shard', so the navigation of each shard stays separate when the capture is
+    parsed.
+
+    Parameters:
+    - shard_files (List[str]): The captures of the shards in shard order. Missing files are skipped.
+    - target (str): The merged JSON lines file.
+
+    Returns:
+    - int: The number of merged entries.
+    """
+    count = 0
+    with open(target + '.tmp', 'w', encoding='utf-8') as out:
+        for shard, shard_file in enumerate(shard_files):
+            if not os.path.exists(shard_file):
+                continue
+            with open(shard_file, 'r', encoding='utf-8') as f:
+                for entry in iter_jsonl_entries(f):
+                    entry['_shard'] = shard
+                    out.write(json.dumps(entry) + '\n')
+                    count += 1
+    os.replace(target + '.tmp', target)
+    return count
+
+
+def capture_path(name: str, snapshot_directory: str) -> str:
+    """
+    Returns the path of the capture of a snapshot: the JSON lines file of the capture addon if there is one,
+    otherwise the HAR file.
+    """
+    for extension in CAPTURE_EXTENSIONS:
+        path = os.path.join(snapshot_directory, name + extension)
+        if os.path.exists(path):
+            return path
+    return os.path.join(snapshot_directory, name + CAPTURE_EXTENSIONS[-1])
+
+
+def iter_capture_entries(file: TextIO, path: str) -> Iterator[dict]:
+    """
+    Yields the entries of an opened capture file in the format given by the extension of its path.
+    """
+    if path.endswith('.jsonl'):
+        return iter_jsonl_entries(file)
+    return iter_har_entries(file)
+
+
+def _iter_object_keys(stream: _JsonStream) -> Iterator[str]:
+    """
+    Yields the keys of the object whose opening brace was already consumed. The caller consumes each value.
+    """
+    if stream.peek() == '}':
+        stream.pos += 1
+        return
+    while True:
+        key = stream.value()
+        stream.expect(':')
+        yield key
+        char = stream.peek()
+        stream.pos += 1
+        if char == '}':
+            return
+        if char != ',':
+            raise ValueError(f'Invalid HAR file: unexpected {char!r} at offset {stream.pos - 1}')
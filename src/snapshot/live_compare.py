@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+
+from src.entity.CompareStatistics import CompareStatistics
+from src.entity.Comparator import DHashComparator
+from src.entity.TreeComparator import DEFAULT_NODE_BUDGET
+from src.entity.Snapshot import Snapshot
+from src.render.render_pool import RenderPool
+from src.shared.document_cache import DocumentCache, DEFAULT_PARSER
+from src.shared.metrics import metrics
+from src.snapshot.snapshot import SnapshotBuilder, compare_identifier, create_comparators, \
+    create_screenshot_cache, fingerprint_snapshot, fingerprint_static_request
+
+
+class LiveComparison:
+    """
+    Compares a capture against a baseline snapshot while it is being written.
+
+    A background thread follows the JSON lines file of the capture addon and merges every new entry into a snapshot.
+    As soon as the crawler moves on from a page, the page is compared with its counterpart in the baseline, so when
+    the crawl ends only the last pages and the global comparators are left. A page that receives further requests
+    later, e.g. when the crawler comes back to it, is compared again with everything it has collected.
+
+    Attributes:
+        baseline (Snapshot): The snapshot the capture is compared with, snapshot 1 of the report.
+        capture_file (str): The JSON lines file written by the capture addon.
+        builder (SnapshotBuilder): Builds the snapshot of the capture, snapshot 2 of the report.
+        tree_node_budget (int): Largest DOM tree, in nodes, that the TreeComparator compares by tree edit distance.
+        poll_interval (float): Seconds to wait for new entries once the end of the file is reached.
+
+    Methods:
+        start(): Starts following the capture file.
+        stop(): Reads the rest of the capture, compares the remaining pages and returns the results.
+
+    Example usage:
+        live_comparison = LiveComparison(baseline, './har_exports/new.jsonl', url, 'baseline-new')
+        live_comparison.start()
+        crawl()
+        snapshot, statistics = live_comparison.stop()
+    """
+
+    def __init__(self, baseline: Snapshot, capture_file: str, base_url: str, compare_name: str,
+                 html_parser: str = DEFAULT_PARSER, render_workers: int = 2,
+                 screenshot_cache_dir: str = './cache/screenshots/', screenshot_cache_size: int = 1024,
+                 tree_node_budget: int = DEFAULT_NODE_BUDGET, poll_interval: float = 0.5):
+        self.baseline = baseline
+        self.capture_file = capture_file
+        self.builder = SnapshotBuilder(base_url)
+        self.poll_interval = poll_interval
+        self.screenshot_dir = f'./reports/screenshots/{compare_name}/'
+        self.document_cache = DocumentCache(html_parser)
+        self.render_workers = render_workers
+        self.screenshot_cache = create_screenshot_cache(screenshot_cache_dir, screenshot_cache_size)
+        self.tree_node_budget = tree_node_budget
+        self.render_pool = None
+        # number of entries merged into each page, and the number it had when it was compared
+        self.versions = {}
+        self.compared_versions = {}
+        self.statistics = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='live-comparison', daemon=True)
+        self.error = None
+
+    def start(self):
+        fingerprint_snapshot(self.baseline)
+        DHashComparator.prepare_screenshot_dir(self.screenshot_dir)
+        self.thread.start()
+
+    def stop(self) -> (Snapshot, CompareStatistics):
+        """
+        Waits until the rest of the capture is read and compared and runs the global comparators.
+
+        Returns:
+        - (Snapshot, CompareStatistics): The snapshot of the capture and the comparison counters.
+        """
+        self.stop_event.set()
+        self.thread.join()
+        if self.error:
+            raise self.error
+        return self.builder.snapshot, self.total_statistics()
+
+    def run(self):
+        try:
+            with RenderPool(size=self.render_workers) as render_pool:
+                self.render_pool = render_pool
+                self.follow_capture()
+                self.builder.finish()
+                self.compare_pages(include_current=True)
+                for static_request in self.baseline.static_requests:
+                    if static_request.identifier not in self.statistics:
+                        self.compare_page(static_request.identifier)
+                with metrics.measure('stage', 'global comparators'):
+                    for comparator in self.create_comparators():
+                        with metrics.measure('comparator', type(comparator).__name__):
+                            comparator.check_similarity_global()
+        except BaseException as error:
+            self.error = error
+
+    def follow_capture(self):
+        """
+        Merges the entries of the capture file as they are appended until stop() is called and the end of the file
+        is reached. A line is only decoded once its line break was written.
+        """
+        while not os.path.exists(self.capture_file):
+            if self.stop_event.wait(self.poll_interval):
+                if not os.path.exists(self.capture_file):
+                    return
+        partial_line = ''
+        with open(self.capture_file, 'r', encoding='utf-8') as f:
+            while True:
+                stopping = self.stop_event.is_set()
+                line = f.readline()
+                while line:
+                    partial_line += line
+                    if partial_line.endswith('\n'):
+                        if partial_line.strip():
+                            self.add_entry(json.loads(partial_line))
+                        partial_line = ''
+                    line = f.readline()
+                if stopping:
+                    return
+                self.compare_pages(include_current=False)
+                self.stop_event.wait(self.poll_interval)
+
+    def add_entry(self, entry: dict):
+        page = self.builder.add_entry(entry)
+        if page is not None:
+            self.versions[page.identifier] = self.versions.get(page.identifier, 0) + 1
+
+    def compare_pages(self, include_current: bool):
+        """
+        Compares every page that changed since its last comparison. The page the crawler is on is left out unless
+        include_current is set, since its async requests are still arriving.
+        """
+        current = self.builder.current_static_request
+        for identifier, version in list(self.versions.items()):
+            if self.compared_versions.get(identifier) == version:
+                continue
+            if identifier == current.identifier and not include_current:
+                continue
+            self.compared_versions[identifier] = version
+            if self.baseline.find_static_request(identifier):
+                fingerprint_static_request(self.builder.snapshot.find_static_request(identifier))
+                self.compare_page(identifier)
+
+    def compare_page(self, identifier: str):
+        """
+        Compares one page of the baseline with the capture, replacing the results of an earlier comparison.
+        """
+        r1 = self.baseline.find_static_request(identifier)
+        for request in [r1] + r1.async_requests:
+            request.changes = []
+        comparators = self.create_comparators()
+        compare_identifier(comparators, self.document_cache, self.baseline, self.builder.snapshot, identifier)
+        statistics = CompareStatistics()
+        for comparator in comparators:
+            statistics.add(comparator.statistics)
+        self.statistics[identifier] = statistics
+
+    def create_comparators(self):
+        return create_comparators(self.baseline, self.builder.snapshot, self.screenshot_dir, self.document_cache,
+                                  self.render_pool, False, self.screenshot_cache, self.tree_node_budget)
+
+    def total_statistics(self) -> CompareStatistics:
+        statistics = CompareStatistics()
+        for identifier_statistics in self.statistics.values():
+            statistics.add(identifier_statistics)
+        return statistics
@@ -0,0 +1,178 @@
+import random
+import re
+import zlib
+from collections import defaultdict
+from typing import List, Tuple
+
+from src.entity.Change import RenamedRequestChange
+from src.entity.Comparator import JaccardComparator
+from src.entity.Request import StaticRequest
+from src.entity.Snapshot import Snapshot
+from src.shared.document_cache import DocumentCache, DEFAULT_PARSER
+from src.shared.metrics import debug
+
+MERSENNE_PRIME = (1 << 61) - 1
+# weight of tie_break_similarity in the score of a candidate pair, the structure similarity weighs 1
+TIE_BREAK_WEIGHT = 0.5
+
+
+class MinHasher:
+    """
+    MinHash signatures of string sets.
+
+    Attributes:
+        num_perm (int): Number of hash functions, i.e. the length of a signature.
+        permutations (list): The (a, b) parameters of the universal hash functions.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        self.num_perm = num_perm
+        generator = random.Random(seed)
+        self.permutations = [(generator.randrange(1, MERSENNE_PRIME), generator.randrange(0, MERSENNE_PRIME))
+                             for _ in range(num_perm)]
+
+    def signature(self, features: set) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(feature.encode('utf-8', 'surrogatepass')) for feature in features]
+        return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self.permutations)
+
+
+def lsh_candidates(signatures1: dict, signatures2: dict, bands: int) -> set:
+    """
+    Finds the pairs of keys whose signatures agree in at least one band.
+
+    Parameters:
+        signatures1 (dict): Signatures of the first side, keyed by identifier.
+        signatures2 (dict): Signatures of the second side, keyed by identifier.
+        bands (int): Number of bands the signatures are split into.
+
+    Returns:
+        set: Candidate pairs (identifier 1, identifier 2).
+    """
+    candidates = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for identifier, signature in signatures1.items():
+            rows = len(signature) // bands
+            buckets[signature[band * rows:(band + 1) * rows]].append(identifier)
+        for identifier2, signature in signatures2.items():
+            rows = len(signature) // bands
+            for identifier1 in buckets.get(signature[band * rows:(band + 1) * rows], []):
+                candidates.add((identifier1, identifier2))
+    return candidates
+
+
+def match_renamed_pages(snap1: Snapshot, snap2: Snapshot, html_parser: str = DEFAULT_PARSER,
+                        threshold: float = 0.8, margin: float = 0.05, num_perm: int = 64,
+                        bands: int = 16) -> List[Tuple[str, str]]:
+    """
+    Pairs pages that only exist in one of the snapshots by the similarity of their class/id/name sets.
+
+    The sets of the unmatched pages are turned into MinHash signatures and indexed with LSH, so only pages sharing a
+    band are compared exactly. Candidate pairs with the same HTTP method and a Jaccard similarity of at least
+    ``threshold`` are scored by that similarity plus a tie break, see tie_break_similarity, since pages built from the
+    same template have nearly the same sets. The pairs are matched greedily, the best first, and a pair is only
+    accepted if it beats every other remaining candidate of both pages by at least ``margin``; a page with two equally
+    good candidates stays unmatched. Matched requests get each other's identifier as matched_identifier, so the
+    comparators treat them as one page, and the request of snapshot 1 gets a RenamedRequestChange.
+
+    Parameters:
+        snap1 (Snapshot): The first snapshot.
+        snap2 (Snapshot): The second snapshot.
+        html_parser (str): BeautifulSoup parser backend.
+        threshold (float): Minimum Jaccard similarity of two matched pages.
+        margin (float): Minimum lead of a pair over the runner-up candidates of its pages.
+        num_perm (int): Length of the MinHash signatures.
+        bands (int): Number of LSH bands, num_perm must be divisible by it.
+
+    Returns:
+        list: The matched (identifier in snapshot 1, identifier in snapshot 2) pairs.
+    """
+    unmatched1 = [r for r in snap1.static_requests if snap2.find_counterpart(r) is None]
+    unmatched2 = [r for r in snap2.static_requests if snap1.find_counterpart(r) is None]
+    if not unmatched1 or not unmatched2:
+        return []
+
+    document_cache = DocumentCache(html_parser)
+    min_hasher = MinHasher(num_perm)
+    sets1, sets2 = structure_sets(unmatched1, document_cache), structure_sets(unmatched2, document_cache)
+    signatures1 = {identifier: min_hasher.signature(features) for identifier, features in sets1.items()}
+    signatures2 = {identifier: min_hasher.signature(features) for identifier, features in sets2.items()}
+
+    scored_pairs = []
+    scores1, scores2 = defaultdict(dict), defaultdict(dict)
+    for identifier1, identifier2 in lsh_candidates(signatures1, signatures2, bands):
+        r1, r2 = snap1.find_static_request(identifier1), snap2.find_static_request(identifier2)
+        if r1.method != r2.method:
+            continue
+        similarity = JaccardComparator.jaccard_similarity(sets1[identifier1], sets2[identifier2])
+        if similarity >= threshold:
+            score = similarity + TIE_BREAK_WEIGHT * tie_break_similarity(r1, r2)
+            scored_pairs.append((-score, similarity, identifier1, identifier2))
+            scores1[identifier1][identifier2] = score
+            scores2[identifier2][identifier1] = score
+
+    pairs = []
+    paired1, paired2 = set(), set()
+    for negative_score, similarity, identifier1, identifier2 in sorted(scored_pairs):
+        if identifier1 in paired1 or identifier2 in paired2:
+            continue
+        runner_up = max([score for identifier, score in scores1[identifier1].items()
+                         if identifier != identifier2 and identifier not in paired2] +
+                        [score for identifier, score in scores2[identifier2].items()
+                         if identifier != identifier1 and identifier not in paired1], default=None)
+        if runner_up is not None and -negative_score - runner_up < margin:
+            debug('ambiguous match', identifier1, 'to', identifier2)
+            continue
+        paired1.add(identifier1)
+        paired2.add(identifier2)
+        pairs.append((identifier1, identifier2))
+
+        r1, r2 = snap1.find_static_request(identifier1), snap2.find_static_request(identifier2)
+        r1.matched_identifier = identifier2
+        r2.matched_identifier = identifier1
+        r1.changes.append(RenamedRequestChange(1 - similarity, f"Request was found as {identifier2.replace('&amp;', '&')} in snapshot 2"))
+    return pairs
+
+
+def tie_break_similarity(r1: StaticRequest, r2: StaticRequest) -> float:
+    """
+    Returns the mean of the URL path similarity and the Jaccard similarity of the async requests of two pages, which
+    separates pages whose structure is equally similar.
+    """
+    async1 = {async_request.identifier for async_request in r1.async_requests}
+    async2 = {async_request.identifier for async_request in r2.async_requests}
+    async_similarity = JaccardComparator.jaccard_similarity(async1, async2) if async1 or async2 else 1.0
+    return (path_similarity(r1.identifier, r2.identifier) + async_similarity) / 2
+
+
+def path_similarity(identifier1: str, identifier2: str) -> float:
+    """
+    Compares the URL paths of two identifiers segment by segment from the end, each segment weighing half as much as
+    the one after it. The last segment usually names the resource while a moved page changes its prefix, so
+    /page/3 is closer to /moved/3 than to /page/75.
+    """
+    segments1 = path_segments(identifier1)
+    segments2 = path_segments(identifier2)
+    total = matched = 0.0
+    weight = 1.0
+    for index in range(1, max(len(segments1), len(segments2)) + 1):
+        if index <= min(len(segments1), len(segments2)) and segments1[-index] == segments2[-index]:
+            matched += weight
+        total += weight
+        weight /= 2
+    return matched / total if total else 1.0
+
+
+def path_segments(identifier: str) -> List[str]:
+    path = re.sub(r'^[A-Z]+', '', identifier).split('?')[0]
+    return [segment for segment in path.split('/') if segment]
+
+
+def structure_sets(requests: List[StaticRequest], document_cache: DocumentCache) -> dict:
+    sets = {}
+    for request in requests:
+        features = JaccardComparator.html_to_set(document_cache.get(request))
+        document_cache.release(request)
+        if features:
+            sets[request.identifier] = features
+    return sets
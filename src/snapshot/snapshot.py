@@ -2,23 +2,41 @@ from src.entity.Request import StaticRequest, AsyncRequest
 from src.entity.Snapshot import Snapshot
 from src.entity.Comparator import Comparator, JaccardComparator, ParamComperator, \
     AsyncRequestsComparator, DHashComparator, AsyncStructureComparator, PagePresenceComparator
-from src.schema.json_schema import create_request_json_schema, create_content_json_schema
-from src.entity.TreeComparator import TreeComparator
-from src.shared.helpers import find_by_identifier, get_unique_identifier, is_relevant, is_static, \
-    is_async
+from src.schema.json_schema import create_request_json_schema, parse_request_json, schema_hash, \
+    prepare_json_sample, merge_json_sample
+from src.entity.TreeComparator import TreeComparator, DEFAULT_NODE_BUDGET
+from src.shared.helpers import get_unique_identifier, is_relevant, classify_entry, content_fingerprint, \
+    combine_schema_hashes
+from src.shared.route_templates import learn_route_templates, route_normalizer
+from src.entity.CompareStatistics import CompareStatistics
 
+from src.snapshot.har_reader import capture_path, iter_capture_entries, decode_jsonl_line
+from src.snapshot.compiled_snapshot import load_compiled_snapshot, save_compiled_snapshot
+from src.snapshot.page_matching import match_renamed_pages
+from src.shared.document_cache import DocumentCache, DEFAULT_PARSER
+from src.shared.metrics import debug, metrics, set_verbose, is_verbose
+from src.shared.blob_store import blob_store, blob_key
+from src.render.render_pool import RenderPool
+from src.render.screenshot_cache import ScreenshotCache
+
+from collections import deque
+from typing import Iterable, List, TextIO
+import copy
+import multiprocessing
+import multiprocessing.util
 import os
-import json
 
-def parse_har_to_snapshot(name: str, snapshot_directory: str) -> Snapshot:
+def parse_har_to_snapshot(name: str, snapshot_directory: str, jobs: int = 1) -> Snapshot:
     """
     Parse HAR to Snapshot.
 
-    This method parses a HAR (HTTP Archive) file and converts it into a Snapshot object.
+    This method parses a HAR (HTTP Archive) file and converts it into a Snapshot object. A JSON lines capture of the
+    capture addon, <name>.jsonl, is read instead of the HAR file if it exists.
 
     Parameters:
     - name (str): The name of the HAR file (without the extension).
     - snapshot_directory (str): The directory where the HAR file and associated files are located.
+    - jobs (int): Number of worker processes that classify the entries, see parse_capture_parallel.
 
     Returns:
     - Snapshot: The parsed snapshot object.
@@ -27,54 +45,349 @@ def parse_har_to_snapshot(name: str, snapshot_directory: str) -> Snapshot:
         snapshot = parse_har_to_snapshot('example', '/path/to/snapshot')
 
     """
-    with open(os.path.join(snapshot_directory, name + '.har'), 'r') as f:
-        data = json.load(f)
+    with open(os.path.join(snapshot_directory, name + '.domain.txt'), 'r') as f:
+        base_url = f.read()
+
+    path = capture_path(name, snapshot_directory)
+    with open(path, 'r') as f:
+        if jobs > 1:
+            return parse_capture_parallel(f, path, base_url, jobs)
+        return parse_har_entries_to_snapshot(iter_capture_entries(f, path), base_url)
+
+
+def learn_snapshot_routes(name: str, snapshot_directory: str, min_values: int = 20) -> List[str]:
+    """
+    Learns route templates from the paths of the relevant requests of a capture, see learn_route_templates.
+
+    Parameters:
+    - name (str): The name of the HAR file (without the extension).
+    - snapshot_directory (str): The directory where the HAR file and associated files are located.
+    - min_values (int): Number of different segments at one path position from which on it is a parameter.
 
+    Returns:
+    - List[str]: The learned templates.
+    """
     with open(os.path.join(snapshot_directory, name + '.domain.txt'), 'r') as f:
         base_url = f.read()
 
-    snapshot = Snapshot(base_url=base_url)
-    current_static_request: StaticRequest = StaticRequest()
-    current_static_request.identifier = 'Root'
-    for entry in data['log']['entries']:
-        if is_relevant(entry, base_url):
-            if is_async(entry):
-                print('async request')
-                identifier = get_unique_identifier(entry, base_url)
-                request = find_by_identifier(current_static_request.async_requests, identifier)
-                if not request:
-                    request = AsyncRequest()
-                    request.har = entry
-                    request.paramSchema = create_request_json_schema(entry)
-                    request.responseSchema = create_content_json_schema(entry)
-                    request.content = entry['response']['content']['text']
-                    request.identifier = identifier
-                else:
-                    request.merge_counter += 1
-                if not find_by_identifier(current_static_request.async_requests, identifier):
-                    current_static_request.async_requests.append(request)
-
-            if is_static(entry):
-                print('static request')
-                identifier = get_unique_identifier(entry, base_url)
-                request = find_by_identifier(snapshot.static_requests, identifier)
-                if not request:
-                    request = StaticRequest()
-                    request.har = entry
-                    request.paramSchema = create_request_json_schema(entry)
-                    request.identifier = identifier
-                    if 'text' in entry['response']['content']:
-                        request.content = entry['response']['content']['text']
-                    snapshot.static_requests.append(request)
-                else:
-                    request.merge_counter += 1
-                if current_static_request and not find_by_identifier(request.previous_requests, current_static_request.identifier):
-                    request.previous_requests.append(current_static_request)
-
-                current_static_request = request
+    path = capture_path(name, snapshot_directory)
+    with open(path, 'r') as f:
+        paths = (entry['request']['url'].replace(base_url, '').split('?')[0]
+                 for entry in iter_capture_entries(f, path) if is_relevant(entry, base_url))
+        return learn_route_templates(paths, min_values)
+
+
+def load_snapshot(name: str, snapshot_directory: str, jobs: int = 1) -> Snapshot:
+    """
+    Load Snapshot.
+
+    Returns the compiled snapshot stored next to the HAR file if it is up to date, otherwise parses the HAR file and
+    stores the compiled snapshot for the next call.
+
+    Parameters:
+    - name (str): The name of the HAR file (without the extension).
+    - snapshot_directory (str): The directory where the HAR file and associated files are located.
+    - jobs (int): Number of worker processes that classify the entries if the HAR file is parsed.
+
+    Returns:
+    - Snapshot: The snapshot object.
+
+    Example Usage:
+        snapshot = load_snapshot('example', '/path/to/snapshot')
+
+    """
+    with metrics.measure('stage', 'load compiled snapshot'):
+        snapshot = load_compiled_snapshot(name, snapshot_directory)
+    if snapshot is None:
+        with metrics.measure('stage', 'parse HAR'):
+            snapshot = parse_har_to_snapshot(name, snapshot_directory, jobs)
+        with metrics.measure('stage', 'save compiled snapshot'):
+            save_compiled_snapshot(snapshot, name, snapshot_directory)
     return snapshot
 
-def compare_snapshots(snap1: Snapshot, snap2: Snapshot, compare_name: str):
+
+def parse_har_entries_to_snapshot(entries: Iterable[dict], base_url: str) -> Snapshot:
+    """
+    Builds a Snapshot from HAR entries.
+
+    The entries are consumed one by one, so a streamed iterable keeps memory bounded by the largest single entry.
+
+    Parameters:
+    - entries (Iterable[dict]): The HAR entries in capture order.
+    - base_url (str): The base URL of the crawled application.
+
+    Returns:
+    - Snapshot: The parsed snapshot object.
+    """
+    builder = SnapshotBuilder(base_url)
+    for entry in entries:
+        builder.add_entry(entry)
+    return builder.finish()
+
+
+def parse_capture_parallel(file: TextIO, path: str, base_url: str, jobs: int, chunk_size: int = 256) -> Snapshot:
+    """
+    Builds a Snapshot from a capture file with several processes.
+
+    Classification, identifier and JSON sampling of an entry do not depend on the other entries, so chunks of
+    entries are classified by a process pool, see classify_har_entry. The results are merged in capture order by
+    SnapshotBuilder.add_classified, which only links the pages and merges the schemas. JSON lines captures are sent
+    to the workers as raw lines, so the workers also decode them; the entries of a HAR file are decoded while the
+    file is streamed. At most two chunks per worker are in flight, so memory stays bounded for any capture size.
+    Once all schemas are merged, the pool also computes their fingerprints.
+
+    Parameters:
+    - file (TextIO): The opened capture file.
+    - path (str): The path of the capture, its extension selects the format.
+    - base_url (str): The base URL of the crawled application.
+    - jobs (int): Number of worker processes.
+    - chunk_size (int): Number of entries per task.
+
+    Returns:
+    - Snapshot: The parsed snapshot object, equal to the one of parse_har_entries_to_snapshot.
+    """
+    is_jsonl = path.endswith('.jsonl')
+    items = file if is_jsonl else iter_capture_entries(file, path)
+    builder = SnapshotBuilder(base_url)
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    with context.Pool(jobs, initializer=init_parse_worker,
+                      initargs=(route_normalizer.patterns, route_normalizer.templates, is_verbose())) as pool:
+        pending = deque()
+
+        def merge_oldest():
+            for classified in pending.popleft().get():
+                builder.add_classified(classified)
+
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                pending.append(pool.apply_async(classify_chunk, (chunk, base_url, is_jsonl)))
+                chunk = []
+                if len(pending) >= 2 * jobs:
+                    merge_oldest()
+        if chunk:
+            pending.append(pool.apply_async(classify_chunk, (chunk, base_url, is_jsonl)))
+        while pending:
+            merge_oldest()
+
+        async_requests = [async_request for static_request in builder.snapshot.static_requests
+                          for async_request in static_request.async_requests]
+        chunks = [[(request.paramSchema, request.responseSchema) for request in async_requests[i:i + chunk_size]]
+                  for i in range(0, len(async_requests), chunk_size)]
+        hashes = (schema_hashes for chunk_hashes in pool.imap(hash_schema_pairs, chunks)
+                  for schema_hashes in chunk_hashes)
+        for async_request, (param_hash, response_hash) in zip(async_requests, hashes):
+            async_request.param_schema_fingerprint = param_hash
+            async_request.response_schema_fingerprint = response_hash
+            async_request.schema_fingerprint = combine_schema_hashes(param_hash, response_hash)
+    return builder.finish()
+
+
+def init_parse_worker(route_patterns: List[str], route_templates: List[str], verbose: bool = False):
+    set_verbose(verbose)
+    route_normalizer.configure(route_patterns, route_templates)
+
+
+def classify_chunk(items: list, base_url: str, is_jsonl: bool) -> list:
+    """
+    Classifies a chunk of HAR entries, or of lines of a JSON lines capture, in a worker process.
+    """
+    entries = (decode_jsonl_line(item) for item in items) if is_jsonl else items
+    return [classify_har_entry(entry, base_url) for entry in entries if entry is not None]
+
+
+def hash_schema_pairs(pairs: list) -> list:
+    """
+    Returns the schema_hash of parameter and response schema of every pair, in a worker process.
+    """
+    return [(schema_hash(param_schema), schema_hash(response_schema)) for param_schema, response_schema in pairs]
+
+
+class ClassifiedEntry:
+    """
+    Everything SnapshotBuilder needs of one HAR entry. It only depends on the entry, so it can be computed in another
+    process, see classify_har_entry.
+
+    Attributes:
+        shard: The HAR custom field '_shard' of the entry.
+        relevant, is_async, is_static (bool): The classification, see classify_entry.
+        identifier (str): The identifier of the request.
+        method (str), post_data (dict), content (str): Method, postData and response body of the entry.
+        content_key (str): The blob key of the response body, '' without body.
+        param_sample, response_sample (tuple): The prepared JSON samples of an async request, see
+            prepare_json_sample, or None if there is no parameter or JSON data.
+        param_schema (dict): The parameter schema of a static request.
+    """
+    __slots__ = ('shard', 'relevant', 'is_async', 'is_static', 'identifier', 'method', 'post_data', 'content',
+                 'content_key', 'param_sample', 'response_sample', 'param_schema')
+
+    def __init__(self, shard=None):
+        self.shard = shard
+        self.relevant = False
+        self.is_async = False
+        self.is_static = False
+        self.identifier = ''
+        self.method = ''
+        self.post_data = None
+        self.content = ''
+        self.content_key = ''
+        self.param_sample = None
+        self.response_sample = None
+        self.param_schema = {}
+
+
+def classify_har_entry(entry: dict, base_url: str) -> ClassifiedEntry:
+    """
+    Classifies a HAR entry and prepares everything SnapshotBuilder merges, independent of all other entries.
+    """
+    classified = ClassifiedEntry(entry.get('_shard'))
+    classification = classify_entry(entry, base_url)
+    if not classification.relevant:
+        return classified
+    classified.relevant = True
+    classified.is_async = classification.is_async
+    classified.is_static = classification.is_static
+    if not (classified.is_async or classified.is_static):
+        return classified
+    classified.identifier = get_unique_identifier(entry, base_url)
+    classified.method = entry['request']['method']
+    classified.post_data = entry['request'].get('postData')
+    classified.content = entry['response']['content'].get('text') or ''
+    if classified.content:
+        classified.content_key = blob_key(classified.content)
+    if classified.is_async:
+        param_data = parse_request_json(entry)
+        if param_data is not None:
+            classified.param_sample = prepare_json_sample(param_data)
+        if classification.content_json is not None:
+            classified.response_sample = prepare_json_sample(classification.content_json)
+    if classified.is_static:
+        classified.param_schema = create_request_json_schema(entry)
+    return classified
+
+
+class SnapshotBuilder:
+    """
+    Builds a Snapshot from HAR entries that are added one at a time, e.g. while they are captured.
+
+    Static requests are merged by identifier and linked to the page that was open before them. Async requests are
+    attached to the page that is open when they arrive, and their schemas are merged over all samples. Entries of a
+    sharded crawl carry the HAR custom field '_shard'; every shard is a navigation sequence of its own, so the first
+    page of a shard is linked to Root instead of to the last page of the shard before.
+
+    Attributes:
+        snapshot (Snapshot): The snapshot built so far.
+        current_static_request (StaticRequest): The page the next async requests belong to.
+
+    Methods:
+        add_entry(entry): Classifies and merges one HAR entry.
+        finish(): Fingerprints the requests and returns the snapshot.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.snapshot = Snapshot(base_url=base_url)
+        self.root = StaticRequest()
+        self.root.identifier = 'Root'
+        self.current_static_request: StaticRequest = self.root
+        # structures already merged into the schemas of each async request, keyed by request id
+        self.seen_structures = {}
+        self.shard = None
+
+    def add_entry(self, entry: dict) -> StaticRequest | None:
+        """
+        Classifies and merges one HAR entry.
+
+        Returns:
+        - StaticRequest | None: The page of the snapshot the entry was merged into, or None if it was not relevant
+          or arrived before the first page.
+        """
+        return self.add_classified(classify_har_entry(entry, self.base_url))
+
+    def add_classified(self, classified: ClassifiedEntry) -> StaticRequest | None:
+        """
+        Merges one entry classified by classify_har_entry. Entries have to be added in capture order.
+
+        Returns:
+        - StaticRequest | None: See add_entry.
+        """
+        if classified.shard != self.shard:
+            self.shard = classified.shard
+            self.current_static_request = self.root
+        if not classified.relevant:
+            return None
+        if classified.is_async:
+            debug('async request')
+            identifier = classified.identifier
+            current_static_request = self.current_static_request
+            request = current_static_request.find_async_request(identifier)
+            if not request:
+                request = AsyncRequest()
+                request.method = classified.method
+                request.post_data = classified.post_data
+                request.paramSchema = {}
+                request.responseSchema = {}
+                request.content_key = store_content(classified)
+                request.identifier = identifier
+                self.seen_structures[request.id] = (set(), set())
+            else:
+                request.merge_counter += 1
+            param_structures, response_structures = self.seen_structures[request.id]
+            request.paramSchema = merge_schema_sample(request.paramSchema, classified.param_sample,
+                                                      param_structures)
+            request.responseSchema = merge_schema_sample(request.responseSchema, classified.response_sample,
+                                                         response_structures)
+            if not current_static_request.find_async_request(identifier):
+                current_static_request.add_async_request(request)
+
+        if classified.is_static:
+            debug('static request')
+            identifier = classified.identifier
+            request = self.snapshot.find_static_request(identifier)
+            if not request:
+                request = StaticRequest()
+                request.method = classified.method
+                request.post_data = classified.post_data
+                request.paramSchema = classified.param_schema
+                request.identifier = identifier
+                request.content_key = store_content(classified)
+                self.snapshot.add_static_request(request)
+            else:
+                request.merge_counter += 1
+            if self.current_static_request and \
+                    not request.find_previous_request(self.current_static_request.identifier):
+                request.add_previous_request(self.current_static_request)
+
+            self.current_static_request = request
+
+        if self.current_static_request is self.root:
+            return None
+        return self.current_static_request
+
+    def finish(self) -> Snapshot:
+        fingerprint_snapshot(self.snapshot)
+        return self.snapshot
+
+
+def store_content(classified: ClassifiedEntry) -> str:
+    return blob_store.put(classified.content, classified.content_key) if classified.content else ''
+
+
+def merge_schema_sample(schema: dict, sample: tuple | None, seen_structures: set) -> dict:
+    """
+    Merges another sample of an endpoint, prepared by prepare_json_sample, into its schema, see infer_json_schema.
+    """
+    if sample is None:
+        return schema
+    data, structure = sample
+    return merge_json_sample(data, structure, schema, seen_structures)
+
+
+def compare_snapshots(snap1: Snapshot, snap2: Snapshot, compare_name: str, html_parser: str = DEFAULT_PARSER,
+                      jobs: int = 1, render_workers: int = 2, screenshot_cache_dir: str = './cache/screenshots/',
+                      screenshot_cache_size: int = 1024, match_pages: bool = False,
+                      tree_node_budget: int = DEFAULT_NODE_BUDGET):
     """
 
     Compare Snapshots
@@ -85,27 +398,228 @@ def compare_snapshots(snap1: Snapshot, snap2: Snapshot, compare_name: str):
     snap1 (Snapshot): The first Snapshot to be compared.
     snap2 (Snapshot): The second Snapshot to be compared.
     compare_name (str): Name for the comparison
+    html_parser (str): BeautifulSoup parser backend used for the HTML comparators, e.g. 'html.parser' or 'lxml'
+    jobs (int): Number of worker processes for the per-identifier comparisons. 1 runs everything in this process.
+    render_workers (int): Number of headless browsers each process keeps open for the screenshots.
+    screenshot_cache_dir (str): Directory of the persistent screenshot and dHash cache.
+    screenshot_cache_size (int): Size cap of the screenshot cache in MB. 0 disables the cache.
+    match_pages (bool): Pair pages that only exist in one snapshot by their structure, so that pages which moved
+        to another URL are compared instead of being reported as missing and new.
+    tree_node_budget (int): Largest DOM tree, in nodes, that the TreeComparator compares by tree edit distance.
 
     Returns:
-    None
+    CompareStatistics: Number of content comparisons run and skipped because both sides were identical.
 
     Examples:
     compare_snapshots(snap1, snap2, "example_comparison")
 
+    """
+    if match_pages:
+        with metrics.measure('stage', 'match pages'):
+            for identifier1, identifier2 in match_renamed_pages(snap1, snap2, html_parser):
+                debug('matched', identifier1, 'to', identifier2)
+    with metrics.measure('stage', 'fingerprint'):
+        fingerprint_snapshot(snap1)
+        fingerprint_snapshot(snap2)
+    statistics = CompareStatistics()
+
+    screenshot_dir = f'./reports/screenshots/{compare_name}/'
+    if jobs > 1:
+        DHashComparator.prepare_screenshot_dir(screenshot_dir)
+        tasks = (create_compare_task(snap1, snap2, static_request.identifier)
+                 for static_request in snap1.static_requests)
+        # fork keeps the CLI module from being re-executed in every worker where it is available
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        pool = context.Pool(jobs, initializer=init_compare_worker,
+                            initargs=(screenshot_dir, html_parser, render_workers, screenshot_cache_dir,
+                                      screenshot_cache_size, tree_node_budget, metrics.enabled, is_verbose()))
+        try:
+            with metrics.measure('stage', 'comparators'):
+                # imap keeps the task order, so changes are merged exactly as in the serial loop
+                for identifier, request_changes, task_statistics, task_metrics in pool.imap(run_compare_task,
+                                                                                            tasks):
+                    merge_request_changes(snap1.find_static_request(identifier), request_changes)
+                    statistics.add(task_statistics)
+                    metrics.add(task_metrics)
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            # a regular shutdown lets the workers quit their browsers
+            pool.join()
+        comparators = [PagePresenceComparator(snap1, snap2)]
+    else:
+        document_cache = DocumentCache(html_parser)
+        screenshot_cache = create_screenshot_cache(screenshot_cache_dir, screenshot_cache_size)
+        with RenderPool(size=render_workers) as render_pool:
+            comparators = create_comparators(snap1, snap2, screenshot_dir, document_cache, render_pool,
+                                             screenshot_cache=screenshot_cache, tree_node_budget=tree_node_budget)
+            with metrics.measure('stage', 'comparators'):
+                for static_request in snap1.static_requests:
+                    compare_identifier(comparators, document_cache, snap1, snap2, static_request.identifier)
+        for comparator in comparators:
+            statistics.add(comparator.statistics)
+
+    with metrics.measure('stage', 'global comparators'):
+        for comparator in comparators:
+            with metrics.measure('comparator', type(comparator).__name__):
+                comparator.check_similarity_global()
+    return statistics
+
+
+def fingerprint_snapshot(snapshot: Snapshot):
+    """
+    Computes the body and schema fingerprints of all requests that do not have them yet.
+    """
+    for static_request in snapshot.static_requests:
+        fingerprint_static_request(static_request, missing_only=True)
+
+
+def fingerprint_static_request(static_request: StaticRequest, missing_only: bool = False):
+    """
+    Computes the body fingerprint of a page and the schema fingerprints of its async requests. With missing_only,
+    fingerprints that were already computed are kept.
+    """
+    if not (missing_only and static_request.content_fingerprint):
+        static_request.content_fingerprint = content_fingerprint(static_request.content)
+    for async_request in static_request.async_requests:
+        if not (missing_only and async_request.schema_fingerprint):
+            async_request.param_schema_fingerprint = schema_hash(async_request.paramSchema)
+            async_request.response_schema_fingerprint = schema_hash(async_request.responseSchema)
+            async_request.schema_fingerprint = combine_schema_hashes(async_request.param_schema_fingerprint,
+                                                                     async_request.response_schema_fingerprint)
+
+
+def create_comparators(snap1: Snapshot, snap2: Snapshot, screenshot_dir: str, document_cache: DocumentCache,
+                       render_pool: RenderPool, clear_screenshot_dir: bool = True,
+                       screenshot_cache: ScreenshotCache = None,
+                       tree_node_budget: int = DEFAULT_NODE_BUDGET) -> [Comparator]:
+    """
+    Creates the comparators in the order in which they are applied to each identifier.
     """
     comparators:[Comparator] = []
     comparators.append(AsyncRequestsComparator(snap1, snap2))
-    comparators.append(JaccardComparator(snap1, snap2))
-    comparators.append(TreeComparator(snap1, snap2))
+    comparators.append(JaccardComparator(snap1, snap2, document_cache))
+    comparators.append(TreeComparator(snap1, snap2, document_cache, tree_node_budget))
     comparators.append(ParamComperator(snap1, snap2))
-    comparators.append(DHashComparator(snap1, snap2, f'./reports/screenshots/{compare_name}/'))
+    comparators.append(DHashComparator(snap1, snap2, screenshot_dir, render_pool, clear_screenshot_dir,
+                                       screenshot_cache))
     comparators.append(AsyncStructureComparator(snap1, snap2))
     comparators.append(PagePresenceComparator(snap1, snap2))
+    return comparators
 
-    for static_request in snap1.static_requests:
-        print('processing', static_request.identifier)
+
+def create_screenshot_cache(directory: str, size_mb: int) -> ScreenshotCache | None:
+    if not size_mb:
+        return None
+    return ScreenshotCache(directory, size_mb)
+
+
+def compare_identifier(comparators: [Comparator], document_cache: DocumentCache, snap1: Snapshot, snap2: Snapshot,
+                       identifier: str):
+    """
+    Runs every comparator for one identifier and releases the parsed documents of both requests afterwards.
+    Content comparators are skipped if both bodies have the same fingerprint.
+    """
+    debug('processing', identifier)
+    r1 = snap1.find_static_request(identifier)
+    r2 = snap2.find_counterpart(r1)
+    identical_content = r2 is not None and r1.content_fingerprint == r2.content_fingerprint
+    with metrics.measure('identifier', identifier):
         for comparator in comparators:
-            comparator.check_similarity(static_request.identifier)
+            if comparator.content_comparator and r2 is not None:
+                if identical_content:
+                    comparator.statistics.skipped_comparisons += 1
+                    continue
+                comparator.statistics.comparisons += 1
+            with metrics.measure('comparator', type(comparator).__name__):
+                comparator.check_similarity(identifier)
+    document_cache.release(r1)
+    if r2:
+        document_cache.release(r2)
+
+
+def detach_static_request(request: StaticRequest | None) -> StaticRequest | None:
+    """
+    Returns a shallow copy of the request without its navigation edges, so that it can be sent to a worker process
+    without pickling the whole snapshot graph behind previous_requests.
+    """
+    if request is None:
+        return None
+    detached = copy.copy(request)
+    detached.previous_requests = []
+    detached.previous_requests_by_identifier = {}
+    return detached
+
+
+def create_compare_task(snap1: Snapshot, snap2: Snapshot, identifier: str):
+    """
+    Returns both pages and the bodies they reference, since a spawned worker does not share the blob store.
+    """
+    r1 = snap1.find_static_request(identifier)
+    r2 = snap2.find_counterpart(r1)
+    bodies = {request.content_key: request.content for static_request in (r1, r2) if static_request
+              for request in [static_request] + static_request.async_requests if request.content_key}
+    return detach_static_request(r1), detach_static_request(r2), bodies
+
+
+worker_state = {}
 
+
+def init_compare_worker(screenshot_dir: str, html_parser: str, render_workers: int, screenshot_cache_dir: str,
+                        screenshot_cache_size: int, tree_node_budget: int = DEFAULT_NODE_BUDGET,
+                        metrics_enabled: bool = False, verbose: bool = False):
+    """
+    Sets up the state a compare worker process keeps for all of its tasks, including its own render pool.
+    """
+    set_verbose(verbose)
+    worker_state['metrics_enabled'] = metrics_enabled
+    render_pool = RenderPool(size=render_workers)
+    multiprocessing.util.Finalize(None, render_pool.close, exitpriority=10)
+    worker_state['screenshot_dir'] = screenshot_dir
+    worker_state['html_parser'] = html_parser
+    worker_state['render_pool'] = render_pool
+    worker_state['screenshot_cache'] = create_screenshot_cache(screenshot_cache_dir, screenshot_cache_size)
+    worker_state['tree_node_budget'] = tree_node_budget
+
+
+def run_compare_task(task) -> (str, dict, CompareStatistics, dict):
+    """
+    Compares one identifier in a worker process.
+
+    Returns:
+    - (str, dict, CompareStatistics, dict): The identifier, the changes found, keyed by the id of the request of
+      snapshot 1 they belong to, the comparison counters and the exported metrics of the task.
+    """
+    metrics.reset(worker_state['metrics_enabled'])
+    r1, r2, bodies = task
+    blob_store.blobs.update(bodies)
+    snap1 = Snapshot(base_url='')
+    snap1.add_static_request(r1)
+    snap2 = Snapshot(base_url='')
+    if r2:
+        snap2.add_static_request(r2)
+
+    requests = [r1] + r1.async_requests
+    for request in requests:
+        request.changes = []
+    document_cache = DocumentCache(worker_state['html_parser'])
+    comparators = create_comparators(snap1, snap2, worker_state['screenshot_dir'], document_cache,
+                                     worker_state['render_pool'], False, worker_state['screenshot_cache'],
+                                     worker_state['tree_node_budget'])
+    compare_identifier(comparators, document_cache, snap1, snap2, r1.identifier)
+    blob_store.release(bodies)
+    statistics = CompareStatistics()
     for comparator in comparators:
-        comparator.check_similarity_global()
\ No newline at end of file
+        statistics.add(comparator.statistics)
+    return (r1.identifier, {request.id: request.changes for request in requests if request.changes}, statistics,
+            metrics.export())
+
+
+def merge_request_changes(static_request: StaticRequest, request_changes: dict):
+    """
+    Appends the changes returned by a worker to the static request and its async requests.
+    """
+    for request in [static_request] + static_request.async_requests:
+        request.changes.extend(request_changes.get(request.id, []))
@@ -0,0 +1,129 @@
+from typing import List, Dict, Tuple
+
+from src.entity.Change import Change, NewRequestChange
+from src.entity.Snapshot import Snapshot
+from src.snapshot.snapshot import load_snapshot, compare_snapshots
+
+
+class TimelineEntry:
+    """
+    Class representing the history of one kind of change of one request over a series of snapshots.
+
+    Attributes:
+        static_identifier (str): Identifier of the page the request belongs to.
+        identifier (str): Identifier of the request, equal to static_identifier for pages.
+        change_name (str): Name of the change type, e.g. 'JaccardStructureChange'.
+        vs_baseline (list): Names of the snapshots in which the change was found compared to the baseline.
+        vs_previous (list): Names of the snapshots in which the change was found compared to their predecessor.
+        last_change (Change): The most recent change found compared to the baseline.
+    """
+
+    def __init__(self, static_identifier: str, identifier: str, change_name: str):
+        self.static_identifier = static_identifier
+        self.identifier = identifier
+        self.change_name = change_name
+        self.vs_baseline = []
+        self.vs_previous = []
+        self.last_change = None
+
+    def first_seen(self) -> str:
+        return self.vs_baseline[0] if self.vs_baseline else ''
+
+
+class Timeline:
+    """
+    Class representing the change history of a series of snapshots compared to a pinned baseline.
+
+    Attributes:
+        snapshot_names (list): The names of the snapshots, the baseline first.
+        entries (dict): The TimelineEntry objects keyed by (static identifier, identifier, change name), in the
+            order in which the changes first appeared.
+    """
+    snapshot_names: List[str]
+    entries: Dict[Tuple[str, str, str], TimelineEntry]
+
+    def __init__(self, snapshot_names: List[str]):
+        self.snapshot_names = snapshot_names
+        self.entries = {}
+
+    def entry(self, key: Tuple[str, str, str]) -> TimelineEntry:
+        if key not in self.entries:
+            self.entries[key] = TimelineEntry(*key)
+        return self.entries[key]
+
+
+def compare_timeline(snapshot_names: List[str], snapshot_directory: str, **compare_options) -> Timeline:
+    """
+    Compare Timeline
+
+    Compares every snapshot after the first one with the first one, the baseline, and with its predecessor. The
+    baseline and the predecessor stay loaded and fingerprinted in memory, so every snapshot is loaded only once.
+
+    Parameters:
+    snapshot_names (List[str]): The names of the snapshots in chronological order, the baseline first.
+    snapshot_directory (str): The directory where the snapshots are located.
+    compare_options: Further keyword arguments for compare_snapshots.
+
+    Returns:
+    Timeline: The change history of all requests.
+
+    Examples:
+    timeline = compare_timeline(['monday', 'tuesday', 'wednesday'], './har_exports')
+    """
+    timeline = Timeline(snapshot_names)
+    baseline_name = snapshot_names[0]
+    jobs = compare_options.get('jobs', 1)
+    baseline = load_snapshot(baseline_name, snapshot_directory, jobs)
+    previous_name, previous = baseline_name, baseline
+
+    for name in snapshot_names[1:]:
+        snapshot = load_snapshot(name, snapshot_directory, jobs)
+
+        compare_snapshots(baseline, snapshot, f'{baseline_name}-{name}', **compare_options)
+        for key, change in collect_changes(baseline, snapshot).items():
+            entry = timeline.entry(key)
+            entry.vs_baseline.append(name)
+            entry.last_change = change
+        reset_changes(baseline, snapshot)
+
+        if previous is not baseline:
+            compare_snapshots(previous, snapshot, f'{previous_name}-{name}', **compare_options)
+            changes = collect_changes(previous, snapshot)
+            reset_changes(previous, snapshot)
+        else:
+            changes = {key: None for key, entry in timeline.entries.items() if name in entry.vs_baseline}
+        for key in changes:
+            timeline.entry(key).vs_previous.append(name)
+
+        previous_name, previous = name, snapshot
+    return timeline
+
+
+def collect_changes(snap1: Snapshot, snap2: Snapshot) -> Dict[Tuple[str, str, str], Change]:
+    """
+    Returns the changes a comparison left on the requests of snapshot 1, and the new requests of snapshot 2, keyed
+    by (static identifier, identifier, change name).
+    """
+    changes = {}
+    for static_request in snap1.static_requests:
+        for request in [static_request] + static_request.async_requests:
+            for change in request.changes:
+                changes[(static_request.identifier, request.identifier, str(change))] = change
+    for static_request in snap2.static_requests:
+        for request in [static_request] + static_request.async_requests:
+            for change in request.changes:
+                if isinstance(change, NewRequestChange):
+                    changes[(static_request.identifier, request.identifier, str(change))] = change
+    return changes
+
+
+def reset_changes(*snapshots: Snapshot):
+    """
+    Removes everything a comparison left on the requests, so the snapshots can be compared again.
+    """
+    for snapshot in snapshots:
+        for static_request in snapshot.static_requests:
+            static_request.changes = []
+            static_request.matched_identifier = ''
+            for async_request in static_request.async_requests:
+                async_request.changes = []
@@ -0,0 +1,30 @@
+import io
+import json
+
+from src.snapshot.har_reader import iter_har_entries
+
+HAR = {
+    'time': 1.5,
+    'log': {
+        'version': 2e3,
+        'creator': {'name': 'mitmproxy', 'version': '10.1.5'},
+        'pages': [-0.25E-2, 12, 3.125e+2],
+        'entries': [
+            {'startedDateTime': '2024-01-01T00:00:00+00:00', 'time': 12.75, 'timings': {'wait': 1e-3},
+             'request': {'method': 'GET', 'url': 'http://localhost/', 'headers': []},
+             'response': {'status': 200, 'content': {'size': 15, 'text': '<p>1.5e3</p>'}}},
+            {'startedDateTime': '2024-01-01T00:00:01+00:00', 'time': 0.5, 'timings': {'wait': -2.5E+1},
+             'request': {'method': 'POST', 'url': 'http://localhost/api', 'headers': []},
+             'response': {'status': 201, 'content': {'size': 9, 'text': '{"a": 1}'}}},
+        ],
+        'comment': 7.0,
+    },
+    'size': 1e10,
+}
+
+
+def test_every_chunk_size_yields_the_entries_of_json_load():
+    text = json.dumps(HAR)
+    expected = json.loads(text)['log']['entries']
+    for chunk_size in range(1, len(text) + 2):
+        assert list(iter_har_entries(io.StringIO(text), chunk_size)) == expected, chunk_size
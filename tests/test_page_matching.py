@@ -0,0 +1,54 @@
+from src.entity.Request import StaticRequest, AsyncRequest
+from src.entity.Snapshot import Snapshot
+from src.snapshot.page_matching import match_renamed_pages
+
+TEMPLATE = ('<html><body><div id="header" class="nav top"><a class="logo" name="home">Shop</a></div>'
+            '<main class="content article"><h1 class="title">Item</h1><p class="text lead">{text}</p>'
+            '<form name="cart"><input name="quantity" class="field"></form></main>'
+            '<footer id="footer" class="bottom small"></footer></body></html>')
+
+
+def create_page(path: str, async_paths=()) -> StaticRequest:
+    request = StaticRequest()
+    request.identifier = 'GET' + path
+    request.method = 'GET'
+    request.content = TEMPLATE.format(text=path)
+    for async_path in async_paths:
+        async_request = AsyncRequest()
+        async_request.identifier = 'GET' + async_path
+        request.add_async_request(async_request)
+    return request
+
+
+def create_snapshot(pages) -> Snapshot:
+    snapshot = Snapshot(base_url='http://localhost')
+    for page in pages:
+        snapshot.add_static_request(page if isinstance(page, StaticRequest) else create_page(page))
+    return snapshot
+
+
+def test_templated_pages_are_matched_by_their_path():
+    kept = [f'/page/{number}' for number in (1, 2, 5, 6, 7, 8, 9)]
+    snap1 = create_snapshot(kept + ['/page/3', '/page/4', '/page/21', '/page/25', '/page/34'])
+    snap2 = create_snapshot(kept + ['/moved/3', '/moved/4', '/page/71', '/page/75', '/page/84'])
+
+    pairs = match_renamed_pages(snap1, snap2)
+
+    assert sorted(pairs) == [('GET/page/3', 'GET/moved/3'), ('GET/page/4', 'GET/moved/4')]
+    assert snap2.find_counterpart(snap1.find_static_request('GET/page/21')) is None
+
+
+def test_identical_templated_pages_stay_unmatched():
+    snap1 = create_snapshot(['/product/1', '/product/2'])
+    snap2 = create_snapshot(['/item/x'])
+
+    assert match_renamed_pages(snap1, snap2) == []
+    assert all(not request.changes for request in snap1.static_requests)
+
+
+def test_async_requests_break_a_tie():
+    snap1 = create_snapshot([create_page('/product/1', ['/api/stock/1']),
+                             create_page('/product/2', ['/api/stock/2'])])
+    snap2 = create_snapshot([create_page('/item/x', ['/api/stock/2'])])
+
+    assert match_renamed_pages(snap1, snap2) == [('GET/product/2', 'GET/item/x')]